@@ -2,7 +2,10 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.forms import BaseInlineFormSet
 from django import forms
-from .models import Branch, WorkingHours, MetalPrice
+from .models import Branch, WorkingHours, MetalPrice, MetalPriceHistory, normalize_phone
+from .branch_directory import invalidate_branch_directory
+from .branch_search import search_queryset
+from .price_board import publish_prices
 
 from django.utils import timezone
 from django.http import HttpResponseRedirect
@@ -13,6 +16,7 @@ import decimal
 from .views.price_calculator import price_calculator
 from django.contrib import messages
 from django.db import transaction
+from django.db.models import Q
 
 # --------------------------РАСПИСАНИЕ--------------------------------------------------------------------------------
 class WorkingHoursForm(forms.ModelForm):
@@ -84,6 +88,20 @@ class WorkingHoursInline(admin.TabularInline):
         return super().get_formset(request, obj, **kwargs)
 
 
+class OpenNowFilter(admin.SimpleListFilter):
+    """Фильтр по статусу "открыт сейчас" (считается в SQL, см. with_open_status)"""
+    title = 'Статус'
+    parameter_name = 'open_now'
+
+    def lookups(self, request, model_admin):
+        return [('1', 'Открыт'), ('0', 'Закрыт')]
+
+    def queryset(self, request, queryset):
+        if self.value() in ('0', '1'):
+            return queryset.filter(open_now=self.value() == '1')
+        return queryset
+
+
 @admin.register(Branch)
 class BranchAdmin(admin.ModelAdmin):
     """Админка для филиалов"""
@@ -96,7 +114,7 @@ class BranchAdmin(admin.ModelAdmin):
         'is_open_now_display',
         'created_at'
     ]
-    list_filter = ['is_active', 'city', 'created_at']
+    list_filter = ['is_active', OpenNowFilter, 'city', 'created_at']
     search_fields = ['city', 'street', 'house', 'phone']
     list_editable = ['is_active']
     readonly_fields = ['created_at', 'updated_at', 'working_hours_preview']
@@ -151,11 +169,15 @@ class BranchAdmin(admin.ModelAdmin):
                             instance.branch = branch
                             instance.save()
 
+        # Inline-формы сохраняются пачкой — сбрасываем справочник филиалов явно
+        invalidate_branch_directory()
+
     def is_open_now_display(self, obj):
         """Отображение статуса открыт/закрыт в списке"""
-        if obj.is_open_now():
+        if obj.open_now:
             return format_html(
-                '<span style="color: green; font-weight: bold;">● Открыт</span>'
+                '<span style="color: green; font-weight: bold;" title="До закрытия {} мин">● Открыт</span>',
+                obj.minutes_until_close,
             )
         else:
             return format_html(
@@ -163,12 +185,12 @@ class BranchAdmin(admin.ModelAdmin):
             )
 
     is_open_now_display.short_description = 'Статус'
-    is_open_now_display.admin_order_field = 'is_active'
+    is_open_now_display.admin_order_field = 'open_now'
 
     def working_hours_preview(self, obj):
         """Предпросмотр режима работы"""
         if obj.pk:  # Проверяем, что филиал сохранен в БД
-            hours = obj.working_hours.all().order_by('day_of_week')
+            hours = obj.get_schedule()
             if not hours:
                 return "Режим работы не установлен"
 
@@ -187,9 +209,20 @@ class BranchAdmin(admin.ModelAdmin):
 
     working_hours_preview.short_description = 'Текущий режим работы'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по городу и улице с учетом опечаток (индексы PostgreSQL) и по телефону в любом формате"""
+        if not search_term.strip():
+            return queryset, False
+        found = search_queryset(Branch.objects.all(), search_term).values('pk')
+        condition = Q(pk__in=found) | Q(phone__contains=search_term.strip())
+        phone = normalize_phone(search_term)
+        if phone:
+            condition |= Q(phone_e164=phone)
+        return queryset.filter(condition), False
+
     def get_queryset(self, request):
-        """Оптимизация запросов"""
-        return super().get_queryset(request).prefetch_related('working_hours')
+        """Оптимизация запросов; статус "открыт сейчас" считается в том же запросе"""
+        return super().get_queryset(request).with_schedule().with_open_status()
 
 
 # --------------------------ФИЛИАЛЫ-----------------------------------------------------------------------------------
@@ -408,22 +441,29 @@ class MetalPriceAdmin(admin.ModelAdmin):
         return render(request, 'admin/metal_price_update.html', context)
 
     def update_all_prices_in_db(self, gold_585_price, silver_925_price, gold_prices):
-        """Обновить все цены в базе данных"""
-        # Для золота
-        gold_samples = [375, 500, 585, 750, 850]
-        for sample in gold_samples:
-            price = gold_prices.get(sample, Decimal('0'))
-
-            # Обновляем или создаем
-            MetalPrice.objects.update_or_create(
-                metal_type='gold',
-                sample=sample,
-                defaults={'price_per_gram': price}
-            )
+        """Обновить все цены в базе данных одной публикацией"""
+        prices = {
+            ('gold', sample): gold_prices.get(sample, Decimal('0'))
+            for sample in MetalPrice.GOLD_SAMPLES
+        }
+        prices[('silver', 925)] = silver_925_price
+
+        publish_prices(prices)
 
-        # Для серебра
-        MetalPrice.objects.update_or_create(
-            metal_type='silver',
-            sample=925,
-            defaults={'price_per_gram': silver_925_price}
-        )
\ No newline at end of file
+
+@admin.register(MetalPriceHistory)
+class MetalPriceHistoryAdmin(admin.ModelAdmin):
+    """История цен: только просмотр"""
+    list_display = ['metal_type', 'sample', 'price_per_gram', 'effective_at']
+    list_filter = ['metal_type', 'sample']
+    date_hierarchy = 'effective_at'
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
\ No newline at end of file
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AppLombardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_lombard'
+
+    def ready(self):
+        # Подключаем обработчики сигналов (сброс кэшированных снимков)
+        from . import signals  # noqa: F401
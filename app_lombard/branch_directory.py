@@ -0,0 +1,96 @@
+import hashlib
+import json
+from collections import defaultdict
+
+from .models import Branch
+from .snapshots import BRANCHES_NAMESPACE, VersionedSnapshot
+
+
+def city_bounds(branches):
+    """Границы филиалов города [юг, запад, север, восток] для начального вида карты"""
+    points = [(b['latitude'], b['longitude']) for b in branches if b['latitude'] and b['longitude']]
+    if not points:
+        return None
+    latitudes, longitudes = zip(*points)
+    return [min(latitudes), min(longitudes), max(latitudes), max(longitudes)]
+
+
+def build_branch_directory():
+    """Строит справочник филиалов: города, карточки, расписания и JSON для карт"""
+    branches = Branch.objects.filter(is_active=True).with_schedule()
+
+    # Группируем филиалы по городам
+    cities_dict = defaultdict(list)
+
+    for branch in branches:
+        # Получаем расписание для каждого филиала
+        schedule = []
+        for wh in branch.get_schedule():
+            if wh.is_closed:
+                time_str = "Выходной"
+            else:
+                open_time = wh.opening_time.strftime('%H:%M') if wh.opening_time else '--:--'
+                close_time = wh.closing_time.strftime('%H:%M') if wh.closing_time else '--:--'
+                time_str = f"{open_time} - {close_time}"
+
+            schedule.append({
+                'day': wh.get_day_of_week_display(),
+                'time': time_str,
+                'is_closed': wh.is_closed
+            })
+
+        # Версия карточки филиала: ключ кэша фрагмента на странице филиалов
+        schedule_version = hashlib.md5(repr(schedule).encode()).hexdigest()[:8]
+        cities_dict[branch.city].append({
+            'id': branch.id,
+            'card_version': f'{branch.updated_at.timestamp():.6f}-{schedule_version}',
+            'city': branch.city,
+            'address': f"{branch.street}, {branch.house}",
+            'phone': branch.phone,
+            'formatted_phone': branch.get_formatted_phone(),
+            'description': branch.description,
+            'latitude': float(branch.latitude) if branch.latitude else None,
+            'longitude': float(branch.longitude) if branch.longitude else None,
+            'schedule': schedule,
+        })
+
+    # Формируем данные для городов (по алфавиту)
+    cities_data = [
+        {
+            'city': city,
+            'branch_count': len(city_branches),
+            'branches': city_branches,
+            'bounds': city_bounds(city_branches),
+        }
+        for city, city_branches in sorted(cities_dict.items())
+    ]
+
+    # Данные для JSON (для карт); статус "открыт" подставляется на странице
+    cities_json_data = [
+        {
+            'city': city_data['city'],
+            'branches': [b for b in city_data['branches'] if b['latitude'] and b['longitude']]
+        }
+        for city_data in cities_data
+    ]
+
+    return {
+        'cities': cities_data,
+        'cities_json': json.dumps(cities_json_data, ensure_ascii=False),
+        'branch_ids': [b['id'] for city_data in cities_data for b in city_data['branches']],
+        'total_branches': len(branches),
+    }
+
+
+branch_directory = VersionedSnapshot('branch_directory', BRANCHES_NAMESPACE, build_branch_directory)
+
+
+def get_branch_directory():
+    """Возвращает актуальный снимок справочника филиалов"""
+    return branch_directory.get()
+
+
+def invalidate_branch_directory():
+    """Сбрасывает все снимки, построенные по филиалам и расписанию"""
+    branch_directory.invalidate()
+
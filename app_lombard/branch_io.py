@@ -0,0 +1,257 @@
+import csv
+import datetime
+import json
+import math
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .branch_directory import invalidate_branch_directory
+from .models import Branch, WorkingHours, phone_validator
+
+BRANCH_FIELDS = ['city', 'street', 'house', 'phone', 'description', 'is_active', 'latitude', 'longitude']
+DAY_FIELDS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+FIELDS = BRANCH_FIELDS + DAY_FIELDS
+DAY_OFF = 'выходной'
+
+
+def detect_format(path, fmt=None):
+    """Формат файла: явно указанный или по расширению (csv / jsonl)"""
+    if fmt:
+        return fmt
+    return 'jsonl' if str(path).endswith(('.json', '.jsonl')) else 'csv'
+
+
+def read_records(file, fmt):
+    """Построчно читает записи филиалов из CSV или JSON Lines.
+
+    Вместо строки с некорректным JSON возвращается ValidationError, чтобы импорт
+    сообщил об ошибке в этой записи и продолжил работу.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield ValidationError(f'Некорректный JSON: {e.msg}')
+
+
+def write_records(file, fmt, records):
+    """Построчно пишет записи филиалов в CSV или JSON Lines"""
+    if fmt == 'csv':
+        writer = csv.DictWriter(file, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+    else:
+        for record in records:
+            file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def parse_hours(value):
+    """'09:00-19:00' -> (time, time); пусто или 'выходной' -> None"""
+    if value is not None and not isinstance(value, str):
+        raise ValidationError(f'Некорректный режим работы: {value!r}')
+    value = (value or '').strip()
+    if not value or value.lower() == DAY_OFF:
+        return None
+    try:
+        opening, closing = (datetime.time.fromisoformat(part.strip()) for part in value.split('-'))
+    except ValueError:
+        raise ValidationError(f'Некорректный режим работы: {value}')
+    if opening >= closing:
+        raise ValidationError('Время открытия должно быть раньше времени закрытия')
+    return opening, closing
+
+
+def format_hours(working_hours):
+    if working_hours is None or working_hours.is_closed:
+        return DAY_OFF
+    return f"{working_hours.opening_time:%H:%M}-{working_hours.closing_time:%H:%M}"
+
+
+def parse_record(record):
+    """Проверяет запись и возвращает (поля филиала, расписание по дням)"""
+    if isinstance(record, ValidationError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValidationError('Запись должна быть объектом')
+
+    phone = ''.join(ch for ch in str(record.get('phone', '')) if ch not in ' ()-')
+    phone_validator(phone)
+
+    for field in ('city', 'street', 'house'):
+        if not str(record.get(field, '')).strip():
+            raise ValidationError(f'Не заполнено поле {field}')
+
+    try:
+        latitude = float(record['latitude'])
+        longitude = float(record['longitude'])
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError('Некорректные координаты')
+    if not (math.isfinite(latitude) and math.isfinite(longitude)) or abs(latitude) > 90 or abs(longitude) > 180:
+        raise ValidationError('Координаты вне допустимого диапазона')
+
+    is_active = record.get('is_active', True)
+    if isinstance(is_active, str):
+        is_active = is_active.strip().lower() not in ('0', 'false', 'нет', '')
+
+    fields = {
+        'city': str(record['city']).strip(),
+        'street': str(record['street']).strip(),
+        'house': str(record['house']).strip(),
+        'phone': phone,
+        'description': record.get('description') or '',
+        'is_active': bool(is_active),
+        'latitude': latitude,
+        'longitude': longitude,
+    }
+    # Длины полей и остальные ограничения модели: иначе ошибка БД прервала бы всю пачку
+    try:
+        Branch(**fields).clean_fields(exclude=Branch.PHONE_FIELDS)
+    except ValidationError as e:
+        raise ValidationError([
+            f'{field}: {message}' for field, messages in e.message_dict.items() for message in messages
+        ])
+
+    schedule = [parse_hours(record.get(day)) for day in DAY_FIELDS]
+    return fields, schedule
+
+
+def make_working_hours(branch_id, day, hours):
+    return WorkingHours(
+        branch_id=branch_id,
+        day_of_week=day,
+        opening_time=hours[0] if hours else None,
+        closing_time=hours[1] if hours else None,
+        is_closed=hours is None,
+    )
+
+
+def branch_to_record(branch):
+    hours = {wh.day_of_week: wh for wh in branch.get_schedule()}
+    record = {field: getattr(branch, field) for field in BRANCH_FIELDS}
+    for day, field in enumerate(DAY_FIELDS):
+        record[field] = format_hours(hours.get(day))
+    return record
+
+
+def export_branches(file, fmt, chunk_size=2000):
+    """Выгружает все филиалы потоком, не загружая таблицу целиком"""
+    branches = Branch.objects.order_by('id').with_schedule().iterator(chunk_size=chunk_size)
+    write_records(file, fmt, (branch_to_record(branch) for branch in branches))
+
+
+class BranchImporter:
+    """Загружает филиалы пачками: bulk_create для новых, bulk_update для существующих.
+
+    Ключ филиала — (город, улица, дом). Расписание загруженных филиалов
+    полностью заменяется данными из файла.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        self.existing = {}
+        for values in Branch.objects.values_list('id', *BRANCH_FIELDS):
+            fields = dict(zip(BRANCH_FIELDS, values[1:]))
+            self.existing[(fields['city'], fields['street'], fields['house'])] = (values[0], fields)
+
+    def run(self, records):
+        batch = {}
+        for line, record in enumerate(records, start=1):
+            try:
+                fields, schedule = parse_record(record)
+            except ValidationError as e:
+                self.errors.append((line, '; '.join(e.messages)))
+                continue
+
+            # Повтор ключа в файле — побеждает последняя строка
+            batch[(fields['city'], fields['street'], fields['house'])] = (fields, schedule)
+            if len(batch) >= self.batch_size:
+                self.save_batch(batch)
+                batch = {}
+
+        if batch:
+            self.save_batch(batch)
+        invalidate_branch_directory()
+
+    def current_schedules(self, branch_ids):
+        """Текущее расписание филиалов в том же виде, что и parse_record, и набор имеющихся дней"""
+        schedules = {branch_id: [None] * 7 for branch_id in branch_ids}
+        present = set()
+        rows = WorkingHours.objects.filter(branch_id__in=branch_ids).values_list(
+            'branch_id', 'day_of_week', 'opening_time', 'closing_time', 'is_closed'
+        )
+        for branch_id, day, opening_time, closing_time, is_closed in rows:
+            present.add((branch_id, day))
+            if not is_closed and opening_time and closing_time:
+                schedules[branch_id][day] = (opening_time, closing_time)
+        return schedules, present
+
+    @transaction.atomic
+    def save_batch(self, batch):
+        now = timezone.now()
+        schedules, present = self.current_schedules(
+            [self.existing[key][0] for key in batch if key in self.existing]
+        )
+
+        new_branches, changed_branches, changed_fields = [], [], set()
+        # Одинаковые изменения расписания (день, часы) обновляем одним UPDATE на группу
+        hours_updates = defaultdict(list)
+        hours_to_create = []
+        for key, (fields, schedule) in batch.items():
+            if key not in self.existing:
+                new_branches.append(Branch(**fields))
+                continue
+
+            # Неизмененные филиалы не трогаем, чтобы повторная загрузка была дешевой
+            branch_id, current_fields = self.existing[key]
+            fields_changed = [field for field in BRANCH_FIELDS if fields[field] != current_fields[field]]
+            if fields_changed:
+                # bulk_update не заполняет auto_now, поэтому дату ставим сами
+                changed_branches.append(Branch(id=branch_id, updated_at=now, **fields))
+                changed_fields.update(fields_changed)
+                self.existing[key] = (branch_id, fields)
+
+            schedule_changed = False
+            for day, hours in enumerate(schedule):
+                if (branch_id, day) not in present:
+                    hours_to_create.append(make_working_hours(branch_id, day, hours))
+                    schedule_changed = True
+                elif hours != schedules[branch_id][day]:
+                    hours_updates[(day, hours)].append(branch_id)
+                    schedule_changed = True
+
+            if fields_changed or schedule_changed:
+                self.updated += 1
+            else:
+                self.unchanged += 1
+
+        Branch.objects.bulk_create(new_branches)
+        # CASE-выражения bulk_update дорогие, поэтому обновляем только изменившиеся поля
+        if changed_branches:
+            Branch.objects.bulk_update(changed_branches, sorted(changed_fields) + ['updated_at'], batch_size=100)
+        for branch in new_branches:
+            key = (branch.city, branch.street, branch.house)
+            self.existing[key] = (branch.id, batch[key][0])
+            hours_to_create.extend(
+                make_working_hours(branch.id, day, hours) for day, hours in enumerate(batch[key][1])
+            )
+
+        for (day, hours), branch_ids in hours_updates.items():
+            WorkingHours.objects.filter(branch_id__in=branch_ids, day_of_week=day).update(
+                opening_time=hours[0] if hours else None,
+                closing_time=hours[1] if hours else None,
+                is_closed=hours is None,
+            )
+        WorkingHours.objects.bulk_create(hours_to_create)
+
+        self.created += len(new_branches)
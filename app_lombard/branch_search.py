@@ -0,0 +1,134 @@
+import difflib
+import functools
+import operator
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Greatest
+
+from .models import Branch
+from .snapshots import BRANCHES_NAMESPACE, VersionedSnapshot
+
+SEARCH_CONFIG = 'russian'
+# То же выражение, что в индексе branch_search_vector_idx (миграция 0003)
+SEARCH_VECTOR = SearchVector('city', 'street', config=SEARCH_CONFIG)
+SEARCH_LIMIT = 20
+MAX_WORDS = 5
+# Запасной поиск: минимальная похожесть слова запроса на слово адреса (0..1)
+FALLBACK_SIMILARITY = 0.75
+
+RESULT_FIELDS = ('id', 'city', 'street', 'house', 'phone_display', 'latitude', 'longitude')
+
+
+def split_words(query):
+    """Слова запроса в нижнем регистре, ё заменена на е"""
+    return re.findall(r'\w+', query.lower().replace('ё', 'е'))[:MAX_WORDS]
+
+
+def postgres_search(queryset, query, words):
+    """Полнотекстовый поиск по-русски или, для слов с опечатками, по триграммам.
+
+    Каждое слово должно быть похоже на город, улицу или совпасть с номером дома.
+    Оба условия используют GIN-индексы из миграции 0003.
+    """
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    fuzzy = Q()
+    similarity = []
+    for word in words:
+        fuzzy &= Q(city__trigram_word_similar=word) | Q(street__trigram_word_similar=word) | Q(house__iexact=word)
+        similarity.append(Greatest(TrigramWordSimilarity(word, 'city'), TrigramWordSimilarity(word, 'street')))
+
+    rank = SearchRank(SEARCH_VECTOR, search_query) + functools.reduce(operator.add, similarity)
+    return queryset.annotate(search=SEARCH_VECTOR, rank=rank).filter(Q(search=search_query) | fuzzy)
+
+
+def build_search_vocabulary():
+    """Для запасного поиска: {слово адреса: {id филиала}}, строки филиалов по id и id активных"""
+    words = defaultdict(set)
+    rows = {}
+    active_ids = set()
+    for *row, is_active in Branch.objects.order_by().values_list(*RESULT_FIELDS, 'is_active'):
+        branch_id, city, street, house = row[:4]
+        rows[branch_id] = row
+        if is_active:
+            active_ids.add(branch_id)
+        for word in split_words(f'{city} {street} {house}'):
+            words[word].add(branch_id)
+    return {'words': dict(words), 'rows': rows, 'active_ids': active_ids}
+
+
+search_vocabulary = VersionedSnapshot('branch_search_vocabulary', BRANCHES_NAMESPACE, build_search_vocabulary)
+
+
+def word_score(word, candidate):
+    if candidate.startswith(word):
+        return 1.0
+    # Короткие слова и номера домов сравниваем только по началу
+    if len(word) < 4 or word.isdigit():
+        return 0.0
+    # Верхняя граница похожести по длинам — дешевле, чем создавать SequenceMatcher
+    if 2 * min(len(word), len(candidate)) < FALLBACK_SIMILARITY * (len(word) + len(candidate)):
+        return 0.0
+    matcher = difflib.SequenceMatcher(None, word, candidate)
+    if matcher.quick_ratio() < FALLBACK_SIMILARITY:
+        return 0.0
+    ratio = matcher.ratio()
+    return ratio if ratio >= FALLBACK_SIMILARITY else 0.0
+
+
+def fallback_scores(words):
+    """{id филиала: ранг} без индексов БД: нечеткое сравнение со словарем слов адресов.
+
+    Словарь (уникальные города, улицы, дома) намного меньше числа филиалов.
+    """
+    vocabulary = search_vocabulary.get()['words']
+    scores = None
+    for word in words:
+        word_scores = {}
+        for candidate, branch_ids in vocabulary.items():
+            score = word_score(word, candidate)
+            if score:
+                for branch_id in branch_ids:
+                    word_scores[branch_id] = max(score, word_scores.get(branch_id, 0))
+        if scores is None:
+            scores = word_scores
+        else:
+            scores = {
+                branch_id: scores[branch_id] + score
+                for branch_id, score in word_scores.items() if branch_id in scores
+            }
+    return scores or {}
+
+
+def search_queryset(queryset, query):
+    """Филиалы из queryset, подходящие под запрос (для админки и других списков)"""
+    words = split_words(query)
+    if not words:
+        return queryset.none()
+    if connection.vendor == 'postgresql':
+        return postgres_search(queryset, query, words)
+    return queryset.filter(pk__in=list(fallback_scores(words)))
+
+
+def search_branches(query, limit=SEARCH_LIMIT):
+    """Активные филиалы по запросу, лучшие совпадения первыми.
+
+    Возвращает список словарей {id, city, street, house, phone_display, latitude, longitude, rank}.
+    """
+    words = split_words(query)
+    if not words:
+        return []
+
+    if connection.vendor == 'postgresql':
+        found = postgres_search(Branch.objects.filter(is_active=True), query, words)
+        return list(found.order_by('-rank', 'city', 'street')[:limit].values(*RESULT_FIELDS, 'rank'))
+
+    scores = fallback_scores(words)
+    vocabulary = search_vocabulary.get()
+    rows = vocabulary['rows']
+    found = [branch_id for branch_id in scores if branch_id in vocabulary['active_ids']]
+    found.sort(key=lambda branch_id: (-scores[branch_id], rows[branch_id][1], rows[branch_id][2]))
+    return [dict(zip(RESULT_FIELDS, rows[branch_id]), rank=scores[branch_id]) for branch_id in found[:limit]]
@@ -0,0 +1,14 @@
+from django.middleware.gzip import GZipMiddleware as BaseGZipMiddleware
+
+# Поток событий нельзя сжимать: каждый фрагмент стал бы отдельным gzip-членом,
+# а часть браузеров распаковывает только первый
+UNCOMPRESSED_CONTENT_TYPES = ('text/event-stream',)
+
+
+class GZipMiddleware(BaseGZipMiddleware):
+    """Сжатие ответов, кроме потоков Server-Sent Events"""
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith(UNCOMPRESSED_CONTENT_TYPES):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,13 @@
+from django.utils.functional import SimpleLazyObject
+
+from .network_stats import get_network_stats
+
+
+def network_stats(request):
+    """Статистика сети филиалов в любом шаблоне: {{ network_stats.total_active }}, {{ network_stats.open_now }}.
+
+    Считается только если шаблон к ней обращается, и без запросов к БД при неизменных филиалах.
+    Async-представления передают network_stats в контексте сами: ленивое значение
+    строится синхронным ORM и не может вычисляться в цикле событий.
+    """
+    return {'network_stats': SimpleLazyObject(get_network_stats)}
@@ -0,0 +1,100 @@
+import heapq
+import math
+
+from .branch_directory import get_branch_directory
+from .snapshots import BRANCHES_NAMESPACE, VersionedSnapshot
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Расстояние по поверхности Земли между двумя точками, км"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def to_unit_vector(lat, lon):
+    """Точка на единичной сфере: хорда между точками монотонна расстоянию по сфере"""
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (
+        math.cos(lat) * math.cos(lon),
+        math.cos(lat) * math.sin(lon),
+        math.sin(lat),
+    )
+
+
+class KDTree:
+    """k-d дерево по трехмерным точкам с поиском k ближайших"""
+
+    def __init__(self, points, items):
+        self.points = points
+        self.items = items
+        self.root = self._build(list(range(len(points))), 0)
+
+    def _build(self, indexes, depth):
+        if not indexes:
+            return None
+        axis = depth % 3
+        indexes.sort(key=lambda i: self.points[i][axis])
+        middle = len(indexes) // 2
+        return (
+            indexes[middle],
+            axis,
+            self._build(indexes[:middle], depth + 1),
+            self._build(indexes[middle + 1:], depth + 1),
+        )
+
+    def nearest(self, point, k, predicate=None):
+        """Возвращает до k ближайших элементов, удовлетворяющих predicate"""
+        heap = []  # (-квадрат расстояния, индекс) — макс-куча из k лучших
+
+        def search(node):
+            if node is None:
+                return
+            index, axis, left, right = node
+            candidate = self.points[index]
+            distance = sum((a - b) ** 2 for a, b in zip(point, candidate))
+
+            if predicate is None or predicate(self.items[index]):
+                if len(heap) < k:
+                    heapq.heappush(heap, (-distance, index))
+                elif distance < -heap[0][0]:
+                    heapq.heapreplace(heap, (-distance, index))
+
+            diff = point[axis] - candidate[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            search(near)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                search(far)
+
+        if k > 0:
+            search(self.root)
+        return [self.items[index] for _, index in sorted(heap, reverse=True)]
+
+
+def build_branch_geo_index():
+    """Строит пространственный индекс активных филиалов с координатами"""
+    directory = get_branch_directory()
+    items = [
+        branch
+        for city_data in directory['cities']
+        for branch in city_data['branches']
+        if branch['latitude'] is not None and branch['longitude'] is not None
+    ]
+    points = [to_unit_vector(b['latitude'], b['longitude']) for b in items]
+    return KDTree(points, items)
+
+
+branch_geo_index = VersionedSnapshot('branch_geo_index', BRANCHES_NAMESPACE, build_branch_geo_index)
+
+
+def find_nearest_branches(latitude, longitude, k=5, branch_filter=None):
+    """Возвращает [(филиал, расстояние в км)] для k ближайших активных филиалов"""
+    tree = branch_geo_index.get()
+    branches = tree.nearest(to_unit_vector(latitude, longitude), k, branch_filter)
+    return [
+        (branch, haversine_km(latitude, longitude, branch['latitude'], branch['longitude']))
+        for branch in branches
+    ]
@@ -0,0 +1,164 @@
+import hashlib
+import io
+import json
+import posixpath
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+
+# Манифест вариантов лежит в STATIC_ROOT рядом с остальной статикой
+MANIFEST_NAME = 'responsive/manifest.json'
+VARIANTS_DIR = 'responsive'
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+DEFAULT_WIDTHS = [320, 640, 960, 1280, 1920]
+# Порядок важен: браузер берет первый поддерживаемый <source>, JPEG — запасной вариант для <img>
+DEFAULT_FORMATS = ['avif', 'webp', 'jpeg']
+SAVE_OPTIONS = {
+    'avif': {'quality': 55},
+    'webp': {'quality': 78, 'method': 6},
+    'jpeg': {'quality': 80, 'optimize': True, 'progressive': True},
+}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+
+
+def get_widths():
+    return sorted(getattr(settings, 'RESPONSIVE_IMAGE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def get_formats():
+    """Форматы из настроек, которые умеет кодировать установленный Pillow, и JPEG последним.
+
+    JPEG нужен всегда: из него строится запасной <img> для браузеров без AVIF/WebP.
+    """
+    from PIL import features
+
+    formats = getattr(settings, 'RESPONSIVE_IMAGE_FORMATS', DEFAULT_FORMATS)
+    return [fmt for fmt in formats if fmt != 'jpeg' and features.check(fmt)] + ['jpeg']
+
+
+def variant_widths(original_width, widths):
+    """Ширины меньше исходной плюс сама исходная: картинки не увеличиваем"""
+    return [width for width in widths if width < original_width] + [original_width]
+
+
+def find_source_images():
+    """{путь в статике: абсолютный путь} растровых картинок из всех finders"""
+    sources = {}
+    for finder in finders.get_finders():
+        for path, storage in finder.list(['CVS', '.*', '*~']):
+            if path.lower().endswith(SOURCE_EXTENSIONS) and path not in sources:
+                sources[path] = storage.path(path)
+    return sources
+
+
+def encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.save(buffer, fmt.upper(), **SAVE_OPTIONS[fmt])
+    return buffer.getvalue()
+
+
+def build_variants(path, content, widths, formats):
+    """Варианты одной картинки.
+
+    Возвращает запись манифеста {'width', 'height', 'variants': {формат: [[ширина, имя]]}}
+    и содержимое файлов {имя: байты}.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(content)) as original:
+        # Учитываем поворот из EXIF до того, как метаданные потеряются
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    stem = posixpath.splitext(path)[0]
+    variants = {fmt: [] for fmt in formats}
+    files = {}
+    for width in variant_widths(original.width, widths):
+        height = round(original.height * width / original.width)
+        resized = original if width == original.width else original.resize((width, height), Image.LANCZOS)
+        for fmt in formats:
+            data = encode(resized, fmt)
+            digest = hashlib.md5(data).hexdigest()[:12]
+            name = f'{VARIANTS_DIR}/{stem}.{width}w.{digest}.{EXTENSIONS[fmt]}'
+            variants[fmt].append([width, name])
+            files[name] = data
+
+    return {'width': original.width, 'height': original.height, 'variants': variants}, files
+
+
+def read_manifest(storage):
+    if not storage.exists(MANIFEST_NAME):
+        return {}
+    with storage.open(MANIFEST_NAME) as f:
+        return json.loads(f.read().decode()).get('images', {})
+
+
+def generate_responsive_images(storage=None, sources=None, log=None):
+    """Пересобирает варианты картинок и манифест; неизменившиеся исходники не перекодируются.
+
+    Возвращает (перекодировано, пропущено).
+    """
+    storage = storage or staticfiles_storage
+    sources = find_source_images() if sources is None else sources
+    widths, formats = get_widths(), get_formats()
+    previous = read_manifest(storage)
+
+    images, processed, skipped = {}, 0, 0
+    for path, source_path in sorted(sources.items()):
+        with open(source_path, 'rb') as f:
+            content = f.read()
+        # Хэш исходника вместе с параметрами: смена ширин или форматов тоже пересобирает варианты
+        source_hash = hashlib.md5(content + repr((widths, formats)).encode()).hexdigest()
+
+        entry = previous.get(path)
+        if (
+            entry and entry['source'] == source_hash
+            and all(storage.exists(name) for variants in entry['variants'].values() for _, name in variants)
+        ):
+            images[path] = entry
+            skipped += 1
+            continue
+
+        entry, files = build_variants(path, content, widths, formats)
+        for name, data in files.items():
+            # Имя содержит хэш содержимого, поэтому существующий файл уже совпадает
+            if not storage.exists(name):
+                storage.save(name, ContentFile(data))
+        images[path] = dict(entry, source=source_hash)
+        processed += 1
+        if log:
+            log(f'{path}: {len(files)} вариантов')
+
+    if storage.exists(MANIFEST_NAME):
+        storage.delete(MANIFEST_NAME)
+    manifest = {'version': 1, 'formats': formats, 'images': images}
+    storage.save(MANIFEST_NAME, ContentFile(json.dumps(manifest, ensure_ascii=False, indent=2).encode()))
+    load_manifest.cache_clear()
+    return processed, skipped
+
+
+@lru_cache(maxsize=1)
+def load_manifest():
+    """Манифест вариантов из STATIC_ROOT; пустой, если collectstatic еще не запускался"""
+    try:
+        return read_manifest(staticfiles_storage)
+    except (OSError, ValueError):
+        return {}
+
+
+def responsive_images_enabled():
+    # В разработке runserver отдает статику из исходных папок, где вариантов нет
+    return getattr(settings, 'RESPONSIVE_IMAGES', not settings.DEBUG)
+
+
+def get_image_entry(path):
+    if not responsive_images_enabled():
+        return None
+    return load_manifest().get(path)
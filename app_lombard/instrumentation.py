@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import DjangoTemplates, Template
+
+# Сколько последних запросов каждого представления хранить для перцентилей
+SAMPLES_PER_VIEW = 1000
+METRICS = ('queries', 'db_ms', 'template_ms', 'total_ms')
+PERCENTILES = (0.5, 0.9, 0.99)
+
+_current = ContextVar('lombard_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Замеры одного запроса"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка выполнения SQL: считает запросы и время БД текущего HTTP-запроса.
+
+    Запрос находится через ContextVar, поэтому учитываются и запросы async ORM,
+    которые выполняются в отдельном потоке.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_ms += (time.perf_counter() - start) * 1000
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+class MetricsStore:
+    """Агрегаты по представлениям в памяти процесса"""
+
+    def __init__(self, size=SAMPLES_PER_VIEW):
+        self.size = size
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._totals = {}
+
+    def record(self, view_name, sample):
+        with self._lock:
+            samples = self._samples.setdefault(view_name, deque(maxlen=self.size))
+            samples.append(sample)
+            totals = self._totals.setdefault(view_name, dict.fromkeys(('count',) + METRICS, 0))
+            totals['count'] += 1
+            for metric, value in zip(METRICS, sample):
+                totals[metric] += value
+
+    def summary(self):
+        """{view: {'count', 'sum': {...}, 'percentiles': {metric: {q: value}}}}"""
+        with self._lock:
+            samples = {view: list(values) for view, values in self._samples.items()}
+            totals = {view: dict(values) for view, values in self._totals.items()}
+
+        result = {}
+        for view, values in sorted(samples.items()):
+            percentiles = {}
+            for position, metric in enumerate(METRICS):
+                ordered = sorted(sample[position] for sample in values)
+                percentiles[metric] = {
+                    q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+                    for q in PERCENTILES
+                }
+            result[view] = {
+                'count': totals[view]['count'],
+                'sum': {metric: totals[view][metric] for metric in METRICS},
+                'percentiles': percentiles,
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+
+metrics_store = MetricsStore()
+
+
+class InstrumentationMiddleware:
+    """Считает запросы к БД, время БД, шаблонов и общее время каждого представления"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Соединения, открытые до загрузки middleware, сигнал connection_created уже пропустили
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        total_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else 'unresolved'
+        metrics_store.record(view_name, (metrics.queries, metrics.db_ms, metrics.template_ms, total_ms))
+
+        if getattr(settings, 'SERVER_TIMING', False):
+            response['Server-Timing'] = (
+                f'db;dur={metrics.db_ms:.1f};desc="{metrics.queries} queries", '
+                f'tpl;dur={metrics.template_ms:.1f}, total;dur={total_ms:.1f}'
+            )
+        return response
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_ms += (time.perf_counter() - start) * 1000
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, который засекает время рендера шаблонов верхнего уровня"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
@@ -0,0 +1,335 @@
+import asyncio
+import datetime
+import importlib
+import itertools
+import json
+import platform
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+
+import app_lombard.urls
+from app_lombard.instrumentation import metrics_store
+from app_lombard.models import Branch, MetalPrice, MetalPriceHistory, WorkingHours
+from app_lombard.price_board import publish_prices
+from app_lombard.views.price_calculator import price_calculator
+
+CITIES = ['Кострома', 'Ярославль', 'Иваново', 'Владимир', 'Вологда', 'Москва', 'Тверь', 'Рязань']
+
+
+def seed_branches(count):
+    """Создает count филиалов по 7 строк расписания у каждого"""
+    branches = Branch.objects.bulk_create([
+        Branch(
+            city=CITIES[i % len(CITIES)],
+            street=f'Улица {i}',
+            house=str(i % 200 + 1),
+            phone=f'+7494{i:07d}',
+            description='Филиал для нагрузочного теста',
+            latitude=55 + (i * 7919 % 5000) / 1000,
+            longitude=35 + (i * 104729 % 10000) / 1000,
+        )
+        for i in range(count)
+    ], batch_size=500)
+    WorkingHours.objects.bulk_create([
+        WorkingHours(
+            branch=branch,
+            day_of_week=day,
+            opening_time=None if day == 6 else datetime.time(9, 0),
+            closing_time=None if day == 6 else datetime.time(19, 0),
+            is_closed=day == 6,
+        )
+        for branch in branches
+        for day in range(7)
+    ], batch_size=1000)
+
+
+def seed_prices(count):
+    """Создает count записей истории цен и текущее табло"""
+    start = timezone.now() - datetime.timedelta(days=count)
+    keys = MetalPrice.board_keys()
+    records = []
+    for i in range(count):
+        metal_type, sample = keys[i % len(keys)]
+        records.append(MetalPriceHistory(
+            metal_type=metal_type,
+            sample=sample,
+            price_per_gram=Decimal(sample * 10 + i % 100),
+            effective_at=start + datetime.timedelta(days=i // len(keys)),
+        ))
+    MetalPriceHistory.objects.bulk_create(records, batch_size=1000)
+    gold = price_calculator(Decimal('5850'))
+    prices = {('gold', sample): gold[f'proba_{sample}'] for sample in MetalPrice.GOLD_SAMPLES}
+    prices[('silver', 925)] = Decimal('90')
+    publish_prices(prices)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(requests, elapsed, latencies, queries):
+    return {
+        'requests': requests,
+        'rps': round(requests / elapsed, 1),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'p50_ms': round(percentile(latencies, 0.5), 3),
+        'p90_ms': round(percentile(latencies, 0.9), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'queries': queries,
+    }
+
+
+def clone_client(client, client_class=Client):
+    """Отдельный клиент с той же сессией (клиенты нельзя делить между потоками)"""
+    clone = client_class()
+    clone.cookies.update(client.cookies)
+    return clone
+
+
+def check_response(method, url, response):
+    """Сценарий с ошибкой не меряем: код 4xx/5xx или сохранение без редиректа (форма с ошибками)"""
+    if response.status_code >= 400:
+        raise CommandError(f'{url} вернул {response.status_code}')
+    if method == 'post' and response.status_code != 302:
+        raise CommandError(f'{url}: сохранение не прошло, ответ {response.status_code} вместо редиректа')
+
+
+def measure(client, method, url, data, requests, cold, concurrency=1):
+    """Гоняет один сценарий и возвращает латентность, пропускную способность и число запросов к БД.
+
+    При concurrency > 1 запросы идут из нескольких потоков, как у WSGI-сервера с пулом потоков.
+    """
+    check_response(method, url, getattr(client, method)(url, data))  # прогрев
+
+    latencies = []
+    queries = []
+    tickets = itertools.count()
+
+    def worker(worker_client):
+        send = getattr(worker_client, method)
+        while next(tickets) < requests:
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = send(url, data)
+                latencies.append((time.perf_counter() - start) * 1000)
+            check_response(method, url, response)
+            queries.append(len(captured))
+
+    def thread_worker(worker_client):
+        try:
+            worker(worker_client)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(client)
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            futures = [pool.submit(thread_worker, clone_client(client)) for _ in range(concurrency)]
+            for future in futures:
+                future.result()
+    elapsed = time.perf_counter() - started
+
+    return summarize(requests, elapsed, latencies, max(queries))
+
+
+async def measure_async(client, method, url, data, requests, cold, concurrency=1):
+    """То же через ASGI-обработчик: concurrency одновременных запросов в одном цикле событий.
+
+    Число запросов к БД берется из метрик InstrumentationMiddleware (p99 по запросам).
+    """
+    check_response(method, url, await getattr(client, method)(url, data))  # прогрев
+    metrics_store.reset()
+
+    latencies = []
+    tickets = itertools.count()
+
+    async def worker(worker_client):
+        send = getattr(worker_client, method)
+        while next(tickets) < requests:
+            if cold:
+                await cache.aclear()
+            start = time.perf_counter()
+            response = await send(url, data)
+            latencies.append((time.perf_counter() - start) * 1000)
+            check_response(method, url, response)
+
+    clients = [client] + [clone_client(client, AsyncClient) for _ in range(concurrency - 1)]
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(worker_client) for worker_client in clients))
+    elapsed = time.perf_counter() - started
+
+    view_metrics = metrics_store.summary()[resolve(url).view_name]
+    return summarize(requests, elapsed, latencies, view_metrics['percentiles']['queries'][0.99])
+
+
+def add_db_latency(milliseconds):
+    """Имитирует сетевую задержку до БД: пауза перед каждым SQL-запросом"""
+    def delay(execute, sql, params, many, context):
+        time.sleep(milliseconds / 1000)
+        return execute(sql, params, many, context)
+
+    def install(connection, **kwargs):
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False)
+    for existing in connections.all(initialized_only=True):
+        install(existing)
+
+
+@contextmanager
+def async_views():
+    """Переключает маршруты на асинхронные версии представлений (ASYNC_VIEWS)"""
+    with override_settings(ASYNC_VIEWS=True):
+        importlib.reload(app_lombard.urls)
+        clear_url_caches()
+        try:
+            yield
+        finally:
+            importlib.reload(app_lombard.urls)
+            clear_url_caches()
+
+
+def find_regressions(results, baseline, max_regression):
+    """Сравнивает прогон с эталонным: рост p50 сверх допуска или рост числа запросов"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['p50_ms'] > previous['p50_ms'] * (1 + max_regression):
+            regressions.append(f"{name}: p50 {previous['p50_ms']} → {current['p50_ms']} мс")
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: запросов к БД {previous['queries']} → {current['queries']}")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест публичных страниц и обновления цен в админке (на тестовой БД)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branches', type=int, default=100, help='Сколько филиалов создать')
+        parser.add_argument('--prices', type=int, default=1000, help='Сколько записей истории цен создать')
+        parser.add_argument('--requests', type=int, default=50, help='Запросов на каждый сценарий')
+        parser.add_argument('--cold', action='store_true', help='Очищать кэш перед каждым запросом')
+        parser.add_argument('--concurrency', type=int, default=1, help='Одновременных запросов (для чтения)')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Искусственная задержка каждого SQL-запроса, мс')
+        parser.add_argument('--async', action='store_true', dest='use_async',
+                            help='Асинхронные представления через ASGI-обработчик')
+        parser.add_argument('--output', help='Куда сохранить результаты (JSON)')
+        parser.add_argument('--compare', help='Эталонный JSON для сравнения')
+        parser.add_argument('--max-regression', type=float, default=0.25,
+                            help='Допустимый рост p50 относительно эталона (доля)')
+
+    def handle(self, *args, **options):
+        # Тестовая БД создается рядом с основной и удаляется после прогона
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        setup_test_environment()
+        try:
+            results = self.run_benchmarks(options)
+        finally:
+            teardown_test_environment()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'branches': options['branches'],
+                'prices': options['prices'],
+                'cold': options['cold'],
+                'concurrency': options['concurrency'],
+                'db_latency_ms': options['db_latency'],
+                'handler': 'asgi' if options['use_async'] else 'wsgi',
+            },
+            'results': results,
+        }
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<24} {result['rps']:>8} rps  p50 {result['p50_ms']:>8} мс  "
+                f"p99 {result['p99_ms']:>8} мс  запросов {result['queries']}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)['results']
+            regressions = find_regressions(results, baseline, options['max_regression'])
+            if regressions:
+                raise CommandError('Регрессия производительности:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def run_benchmarks(self, options):
+        cache.clear()
+        seed_branches(options['branches'])
+        seed_prices(options['prices'])
+        admin = User.objects.create_superuser('benchmark', password='benchmark')
+        if options['db_latency']:
+            add_db_latency(options['db_latency'])
+
+        if options['use_async']:
+            with async_views():
+                return asyncio.run(self.run_scenarios(AsyncClient, measure_async, admin, options))
+        return self.run_scenarios(Client, measure, admin, options)
+
+    def run_scenarios(self, client_class, measure_scenario, admin, options):
+        """Прогоняет все сценарии; для async-замера возвращает корутину"""
+        public = client_class()
+        staff = client_class()
+        staff.force_login(admin)
+
+        save_prices = {'save': '1', 'gold_585_price': '5850', 'silver_925_price': '90'}
+        scenarios = [
+            ('branches_view', public, 'get', reverse('branches'), None),
+            ('prices_view', public, 'get', reverse('prices'), None),
+            ('about_us', public, 'get', reverse('about_us'), None),
+            ('api_branches', public, 'get', reverse('api_branches'), None),
+            ('api_prices', public, 'get', reverse('api_prices'), None),
+            ('metal_price_changelist', staff, 'get', reverse('admin:app_lombard_metalprice_changelist'), None),
+            ('update_prices_view', staff, 'get', reverse('admin:metal_prices_update'), None),
+            ('update_prices_save', staff, 'post', reverse('admin:metal_prices_update'), save_prices),
+        ]
+
+        def args(method):
+            # Запись гоняем последовательно: параллельные сохранения одних и тех же цен меряют блокировки БД
+            concurrency = options['concurrency'] if method == 'get' else 1
+            return options['requests'], options['cold'], concurrency
+
+        if measure_scenario is measure_async:
+            async def run_all():
+                return {
+                    name: await measure_async(client, method, url, data, *args(method))
+                    for name, client, method, url, data in scenarios
+                }
+            return run_all()
+
+        return {
+            name: measure(client, method, url, data, *args(method))
+            for name, client, method, url, data in scenarios
+        }
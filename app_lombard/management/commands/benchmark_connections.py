@@ -0,0 +1,157 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import Client, RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from .benchmark import percentile, seed_branches, seed_prices
+
+# Настройки соединения для каждого режима DB_POOL_MODE (см. settings.py)
+MODES = {
+    'none': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False},
+    'persistent': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True},
+    'pool': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'pool': {'min_size': 1, 'max_size': 4}},
+}
+
+
+def pool_supported():
+    """Пул есть только у бэкенда PostgreSQL с psycopg 3 и установленным psycopg_pool"""
+    if connection.vendor != 'postgresql':
+        return False
+    try:
+        import psycopg  # noqa: F401
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def configure(mode):
+    """Переключает соединение default на режим mode; вступает в силу со следующего подключения"""
+    connection.close()
+    settings_dict = connection.settings_dict
+    options = MODES[mode]
+    settings_dict['CONN_MAX_AGE'] = options['CONN_MAX_AGE']
+    settings_dict['CONN_HEALTH_CHECKS'] = options['CONN_HEALTH_CHECKS']
+    settings_dict['OPTIONS'] = dict(settings_dict['OPTIONS'])
+    settings_dict['OPTIONS'].pop('pool', None)
+    if 'pool' in options:
+        settings_dict['OPTIONS']['pool'] = options['pool']
+
+
+class Command(BaseCommand):
+    help = (
+        'Сколько соединений с БД открывается на запрос и во что это обходится '
+        'без постоянных соединений, с ними и с пулом (на тестовой БД)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на каждый сценарий')
+        parser.add_argument('--connect-latency', type=float, default=0,
+                            help='Искусственная стоимость установки соединения, мс '
+                                 '(TCP, TLS и аутентификация до удаленного Postgres)')
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES),
+                            help='Какие режимы сравнить')
+
+    def handle(self, *args, **options):
+        # Соединение с SQLite в памяти Django никогда не закрывает, поэтому тестовая БД — файл
+        if connection.vendor == 'sqlite':
+            test_name = os.path.join(tempfile.mkdtemp(), 'benchmark_connections.sqlite3')
+            connection.settings_dict['TEST']['NAME'] = test_name
+        original = {
+            key: connection.settings_dict.get(key) for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')
+        }
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        setup_test_environment()
+        opened = []
+
+        def count_connection(**kwargs):
+            opened.append(1)
+            if options['connect_latency']:
+                time.sleep(options['connect_latency'] / 1000)
+
+        connection_created.connect(count_connection, weak=False)
+        try:
+            results = self.run_benchmarks(options, opened)
+        finally:
+            connection_created.disconnect(count_connection)
+            teardown_test_environment()
+            configure('none')
+            connection.settings_dict.update(original)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for mode, scenarios in results.items():
+            for name, result in scenarios.items():
+                self.stdout.write(
+                    f"{mode:<11} {name:<14} соединений на запрос {result['connections_per_request']:>5}  "
+                    f"p50 {result['p50_ms']:>8} мс  p99 {result['p99_ms']:>8} мс"
+                )
+
+    def run_benchmarks(self, options, opened):
+        seed_branches(20)
+        seed_prices(200)
+        admin = User.objects.create_superuser('benchmark', password='benchmark')
+        staff = Client()
+        staff.force_login(admin)
+        session_cookie = staff.cookies.output(header='', sep=';').strip()
+
+        # Сценарии, которые обращаются к БД на каждом запросе даже с прогретым кэшем
+        scenarios = [
+            ('price_history', reverse('api_price_history') + '?metal=gold&sample=585', {}),
+            ('admin_prices', reverse('admin:app_lombard_metalprice_changelist'), {'HTTP_COOKIE': session_cookie}),
+        ]
+
+        results = {}
+        for mode in options['modes']:
+            if mode == 'pool' and not pool_supported():
+                self.stderr.write('Режим pool пропущен: нужен PostgreSQL и пакет psycopg[pool]')
+                continue
+            configure(mode)
+            results[mode] = {
+                name: self.measure(url, extra, options['requests'], opened)
+                for name, url, extra in scenarios
+            }
+            if mode == 'pool':
+                connection.close_pool()
+        return results
+
+    def measure(self, url, extra, requests, opened):
+        """Гоняет запросы через настоящий WSGI-обработчик, чтобы соединения закрывались как в бою"""
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        cache.clear()
+
+        def send():
+            environ = factory.get(url, **extra).environ
+            statuses = []
+            response = handler(environ, lambda status, headers: statuses.append(status))
+            b''.join(response)
+            # Сервер вызывает close() после отправки ответа: здесь срабатывает request_finished
+            response.close()
+            if not statuses[0].startswith('200'):
+                raise CommandError(f'{url} вернул {statuses[0]}')
+
+        send()  # прогрев
+        opened.clear()
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            send()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        return {
+            'connections_per_request': round(len(opened) / requests, 2),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+            'p50_ms': round(percentile(latencies, 0.5), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+        }
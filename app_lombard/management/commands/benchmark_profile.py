@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.templatetags.static import static
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from .benchmark import percentile, seed_branches, seed_prices
+
+PROFILES = ['development', 'production']
+PAGES = ['index', 'branches', 'prices', 'about_us', 'api_branches']
+# Статика, которую имеет смысл сжимать (картинки уже сжаты)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt')
+# Запуск процесса: настройки, приложения и цепочка middleware, как у WSGI-сервера
+STARTUP_SCRIPT = 'from project_lombard.wsgi import application'
+
+
+def static_sizes(static_root):
+    """Суммарный размер сжимаемой статики: как есть, .gz и .br"""
+    sizes = {'raw': 0, 'gzip': 0, 'brotli': 0, 'files': 0}
+    for directory, _, files in os.walk(static_root):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(directory, name)
+            sizes['files'] += 1
+            sizes['raw'] += os.path.getsize(path)
+            for key, suffix in (('gzip', '.gz'), ('brotli', '.br')):
+                compressed = path + suffix
+                sizes[key] += os.path.getsize(compressed if os.path.exists(compressed) else path)
+    return sizes
+
+
+class Command(BaseCommand):
+    help = 'Время запуска, первого и повторного ответа и размер ответов в профилях development и production'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', nargs='+', choices=PROFILES, default=PROFILES)
+        parser.add_argument('--branches', type=int, default=200, help='Сколько филиалов создать')
+        parser.add_argument('--requests', type=int, default=20, help='Запросов на каждую страницу')
+        # Замер внутри дочернего процесса с нужным DJANGO_ENV
+        parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self.measure_pages(options)))
+            return
+
+        manage_py = os.path.join(settings.BASE_DIR, 'manage.py')
+        with tempfile.TemporaryDirectory() as static_dir:
+            for profile in options['profiles']:
+                env = dict(os.environ, DJANGO_ENV=profile, STATIC_ROOT=os.path.join(static_dir, profile))
+                self.stdout.write(f'== {profile}')
+
+                if profile == 'production':
+                    started = time.perf_counter()
+                    self.run([sys.executable, manage_py, 'collectstatic', '--noinput', '-v0'], env)
+                    sizes = static_sizes(env['STATIC_ROOT'])
+                    self.stdout.write(
+                        f"collectstatic {time.perf_counter() - started:.1f} с; сжимаемая статика "
+                        f"({sizes['files']} файлов): {sizes['raw'] // 1024} КБ, gzip {sizes['gzip'] // 1024} КБ, "
+                        f"brotli {sizes['brotli'] // 1024} КБ"
+                    )
+
+                startups = []
+                for _ in range(3):
+                    started = time.perf_counter()
+                    self.run([sys.executable, '-c', STARTUP_SCRIPT], env)
+                    startups.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(f'запуск процесса {min(startups):.0f} мс')
+
+                command = [
+                    sys.executable, manage_py, 'benchmark_profile', '--child',
+                    '--branches', str(options['branches']), '--requests', str(options['requests']),
+                ]
+                result = json.loads(self.run(command, env))
+                for name, page in result['pages'].items():
+                    self.stdout.write(
+                        f"{name:<14} первый {page['first_ms']:>8} мс  p50 {page['p50_ms']:>7} мс  "
+                        f"{page['bytes'] // 1024:>5} КБ → {page['transfer_bytes'] // 1024:>4} КБ"
+                    )
+                if result['static_cache_control']:
+                    self.stdout.write(f"Cache-Control статики: {result['static_cache_control']}")
+
+    def run(self, command, env):
+        completed = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(f"{' '.join(command[1:3])}: {completed.stderr.strip()}")
+        return completed.stdout
+
+    def measure_pages(self, options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        setup_test_environment()
+        try:
+            cache.clear()
+            seed_branches(options['branches'])
+            seed_prices(200)
+            client = Client()
+
+            pages = {}
+            for name in PAGES:
+                url = reverse(name)
+                started = time.perf_counter()
+                plain = client.get(url)
+                first_ms = (time.perf_counter() - started) * 1000
+
+                latencies = []
+                for _ in range(options['requests']):
+                    started = time.perf_counter()
+                    compressed = client.get(url, headers={'accept-encoding': 'gzip, br'})
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+                pages[name] = {
+                    'first_ms': round(first_ms, 2),
+                    'p50_ms': round(percentile(latencies, 0.5), 2),
+                    'mean_ms': round(statistics.fmean(latencies), 2),
+                    'bytes': len(plain.content),
+                    'transfer_bytes': len(compressed.content),
+                }
+
+            static_cache_control = None
+            if settings.PRODUCTION:
+                # Django-статика админки: имя с хэшем, отдается WhiteNoise
+                response = client.get(static('admin/css/base.css'), headers={'accept-encoding': 'gzip, br'})
+                static_cache_control = f"{response['Cache-Control']}, {response.get('Content-Encoding', '-')}"
+                response.close()
+        finally:
+            teardown_test_environment()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        return {'pages': pages, 'static_cache_control': static_cache_control}
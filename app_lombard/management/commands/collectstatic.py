@@ -0,0 +1,30 @@
+from django.contrib.staticfiles.management.commands import collectstatic
+
+from app_lombard.images import generate_responsive_images
+
+
+class Command(collectstatic.Command):
+    """collectstatic, который после сбора статики генерирует адаптивные варианты картинок"""
+
+    help = collectstatic.Command.help + ' Также генерирует AVIF/WebP/JPEG варианты картинок разной ширины.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--no-images', action='store_true', help='Не генерировать варианты картинок')
+
+    def handle(self, **options):
+        result = super().handle(**options)
+        if options['no_images'] or options['dry_run']:
+            return result
+
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            self.stderr.write('Pillow не установлен: варианты картинок не созданы')
+            return result
+
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        processed, skipped = generate_responsive_images(self.storage, log=log)
+        if options['verbosity'] >= 1:
+            self.stdout.write(f'Картинок перекодировано: {processed}, без изменений: {skipped}')
+        return result
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from app_lombard.branch_io import detect_format, export_branches
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка филиалов и расписаний в CSV или JSON Lines (в том же формате, что и загрузка)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Файл для выгрузки (по умолчанию — stdout)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Формат файла (по умолчанию — по расширению)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = detect_format(path or '', options['format'])
+
+        if path is None:
+            export_branches(self.stdout, fmt)
+            return
+
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            export_branches(f, fmt)
+        self.stdout.write(self.style.SUCCESS(f'Филиалы выгружены в {path}'))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_lombard.branch_io import BranchImporter, detect_format, read_records
+from app_lombard.snapshots import cache_is_process_local
+
+
+class Command(BaseCommand):
+    help = 'Загрузка филиалов и расписаний из CSV или JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с филиалами (.csv или .jsonl)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Формат файла (по умолчанию — по расширению)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Филиалов в одной транзакции')
+
+    def handle(self, *args, **options):
+        # Справочник филиалов сбрасывается через кэш: из отдельного процесса сброс должен дойти до сайта
+        if cache_is_process_local():
+            raise CommandError(
+                'Кэш LocMemCache виден только этому процессу: сайт продолжит показывать старые филиалы. '
+                'Укажите общий кэш в CACHE_BACKEND и CACHE_LOCATION (Redis, Memcached или FileBasedCache)'
+            )
+
+        fmt = detect_format(options['path'], options['format'])
+        importer = BranchImporter(batch_size=options['batch_size'])
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as f:
+                importer.run(read_records(f, fmt))
+        except OSError as e:
+            raise CommandError(f'Не удалось прочитать файл: {e}')
+
+        for line, error in importer.errors[:20]:
+            self.stderr.write(f'Запись {line}: {error}')
+        if len(importer.errors) > 20:
+            self.stderr.write(f'... и еще {len(importer.errors) - 20} ошибок')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано филиалов: {importer.created}, обновлено: {importer.updated}, '
+            f'без изменений: {importer.unchanged}, пропущено с ошибками: {len(importer.errors)}'
+        ))
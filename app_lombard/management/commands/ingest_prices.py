@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_lombard.price_feed import (
+    DEFAULT_DEBOUNCE, DEFAULT_MAX_WAIT, DEFAULT_THRESHOLD, PriceFeedError, PriceFeedWorker, read_quote,
+)
+from app_lombard.snapshots import cache_is_process_local
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка котировок золота 585 и серебра 925 из JSON-файла или HTTP-ленты. '
+        'Остальные пробы пересчитываются, мелкие изменения пропускаются, частые тики объединяются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Путь к JSON-файлу или http(s)-адрес ленты: {"gold_585": ..., "silver_925": ...}')
+        parser.add_argument('--interval', type=float, default=1, help='Секунд между опросами ленты')
+        parser.add_argument('--threshold', default=str(DEFAULT_THRESHOLD),
+                            help='Минимальное изменение цены в процентах для публикации')
+        parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE,
+                            help='Секунд без изменений перед публикацией')
+        parser.add_argument('--max-wait', type=float, default=DEFAULT_MAX_WAIT,
+                            help='Максимальная задержка публикации при непрерывных изменениях')
+        parser.add_argument('--once', action='store_true', help='Прочитать котировку один раз и сразу опубликовать')
+
+    def handle(self, *args, **options):
+        # Версия цен хранится в кэше: из отдельного процесса она должна дойти до сайта
+        if cache_is_process_local():
+            raise CommandError(
+                'Кэш LocMemCache виден только этому процессу: сайт продолжит показывать старые цены. '
+                'Укажите общий кэш в CACHE_BACKEND и CACHE_LOCATION (Redis, Memcached или FileBasedCache)'
+            )
+
+        worker = PriceFeedWorker(
+            threshold=options['threshold'], debounce=options['debounce'], max_wait=options['max_wait'],
+        )
+
+        if options['once']:
+            try:
+                worker.offer(read_quote(options['source']), time.monotonic())
+            except PriceFeedError as e:
+                raise CommandError(e)
+            self.report(worker, worker.flush(time.monotonic(), force=True))
+            return
+
+        try:
+            while True:
+                now = time.monotonic()
+                try:
+                    worker.offer(read_quote(options['source']), now)
+                except PriceFeedError as e:
+                    self.stderr.write(str(e))
+                if worker.flush(now):
+                    self.report(worker, True)
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            # Не теряем последнее изменение при остановке
+            if worker.flush(time.monotonic(), force=True):
+                self.report(worker, True)
+            self.stdout.write(
+                f'Получено котировок: {worker.received}, без изменений: {worker.skipped}, '
+                f'публикаций: {worker.publications}'
+            )
+
+    def report(self, worker, published):
+        if not published:
+            self.stdout.write('Цены не изменились больше порога, публикация не нужна')
+            return
+        prices = ', '.join(
+            f'{metal_type} {sample}: {price}' for (metal_type, sample), price in sorted(worker.published.items())
+        )
+        self.stdout.write(self.style.SUCCESS(f'Цены опубликованы: {prices}'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app_lombard.branch_directory import invalidate_branch_directory
+from app_lombard.map_clusters import request_map_rebuild
+from app_lombard.network_stats import build_network_stats, get_network_stats, network_stats
+from app_lombard.snapshots import cache_is_process_local
+
+COMPARED_KEYS = ('cities', 'active_ids')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счетчики филиалов с базой (для запуска по расписанию). '
+        'Если филиалы менялись в обход сигналов (update(), SQL), сбрасывает снимки'
+    )
+
+    def handle(self, *args, **options):
+        # В процесс-локальном кэше команда видит только свои снимки и не может сбросить снимки сайта
+        if cache_is_process_local():
+            raise CommandError(
+                'Кэш LocMemCache виден только этому процессу: сверять и сбрасывать нечего. '
+                'Укажите общий кэш в CACHE_BACKEND и CACHE_LOCATION (Redis, Memcached или FileBasedCache)'
+            )
+
+        cached = network_stats.get()
+        fresh = build_network_stats()
+
+        if any(cached[key] != fresh[key] for key in COMPARED_KEYS):
+            # Изменения в обход сигналов не трогают updated_at: индекс карты перечитывается целиком
+            request_map_rebuild()
+            invalidate_branch_directory()
+            self.stdout.write(self.style.WARNING(
+                f"Счетчики разошлись с базой: активных {cached['total_active']} → {fresh['total_active']}, "
+                'снимки филиалов сброшены'
+            ))
+
+        stats = get_network_stats()
+        self.stdout.write(
+            f"Активных филиалов: {stats['total_active']} в {stats['city_count']} городах, "
+            f"открыто сейчас: {stats['open_now']}"
+        )
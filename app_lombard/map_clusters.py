@@ -0,0 +1,183 @@
+import datetime
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Branch
+from .snapshots import BRANCHES_NAMESPACE, get_version
+
+# Ячеек сетки на сторону тайла карты (256px): одна ячейка около 64px на экране
+CELLS_PER_TILE = 4
+# Предел широты проекции Меркатора, как у тайлов карты
+MAX_LATITUDE = 85.05112878
+# Запас при догрузке изменений: транзакция могла зафиксироваться позже времени из updated_at
+REFRESH_OVERLAP = datetime.timedelta(minutes=5)
+
+# Метка запроса на полную перестройку индекса во всех процессах
+REBUILD_KEY = 'lombard:map_index:rebuild'
+
+BRANCH_FIELDS = ('id', 'street', 'house', 'phone', 'latitude', 'longitude', 'is_active', 'updated_at')
+
+
+def cell_of(latitude, longitude, zoom):
+    """Ячейка сетки (x, y) точки на уровне zoom; y растет к югу, как у тайлов"""
+    scale = (1 << zoom) * CELLS_PER_TILE
+    sin = math.sin(math.radians(max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))))
+    x = (longitude + 180) / 360 * scale
+    y = (0.5 - math.log((1 + sin) / (1 - sin)) / (4 * math.pi)) * scale
+    return min(max(int(x), 0), scale - 1), min(max(int(y), 0), scale - 1)
+
+
+class ClusterIndex:
+    """Сеточные кластеры филиалов на каждом уровне zoom.
+
+    Ячейка хранит сумму координат и id филиалов, поэтому добавление и удаление
+    филиала стоят O(число уровней), без пересчета всего индекса.
+    """
+
+    def __init__(self, max_zoom):
+        self.max_zoom = max_zoom
+        self.points = {}
+        self.cells = [{} for _ in range(max_zoom + 1)]
+
+    def add(self, branch_id, latitude, longitude, payload):
+        point = (latitude, longitude, payload)
+        if self.points.get(branch_id) == point:
+            return
+        self.remove(branch_id)
+        self.points[branch_id] = point
+        for zoom, cells in enumerate(self.cells):
+            cell = cells.setdefault(cell_of(latitude, longitude, zoom), [0.0, 0.0, set()])
+            cell[0] += latitude
+            cell[1] += longitude
+            cell[2].add(branch_id)
+
+    def remove(self, branch_id):
+        point = self.points.pop(branch_id, None)
+        if point is None:
+            return
+        latitude, longitude, _ = point
+        for zoom, cells in enumerate(self.cells):
+            key = cell_of(latitude, longitude, zoom)
+            cell = cells[key]
+            cell[2].discard(branch_id)
+            if cell[2]:
+                cell[0] -= latitude
+                cell[1] -= longitude
+            else:
+                del cells[key]
+
+    def cells_in(self, south, west, north, east, zoom):
+        x0, y0 = cell_of(north, west, zoom)
+        x1, y1 = cell_of(south, east, zoom)
+        cells = self.cells[zoom]
+        # Маленькое окно перебираем по ячейкам, большое — по непустым ячейкам уровня
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(cells):
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    if (x, y) in cells:
+                        yield cells[(x, y)]
+        else:
+            for (x, y), cell in cells.items():
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    yield cell
+
+    def query(self, south, west, north, east, zoom):
+        """Кластеры [[широта, долгота, количество]] и id отдельных филиалов в границах"""
+        clusters, branch_ids = [], []
+        if zoom > self.max_zoom:
+            # Крупный масштаб: все филиалы по отдельности, кандидаты берем из самой мелкой сетки
+            for cell in self.cells_in(south, west, north, east, self.max_zoom):
+                for branch_id in cell[2]:
+                    latitude, longitude, _ = self.points[branch_id]
+                    if south <= latitude <= north and west <= longitude <= east:
+                        branch_ids.append(branch_id)
+            return clusters, branch_ids
+
+        for sum_latitude, sum_longitude, ids in self.cells_in(south, west, north, east, zoom):
+            if len(ids) == 1:
+                branch_ids.extend(ids)
+            else:
+                count = len(ids)
+                clusters.append([round(sum_latitude / count, 6), round(sum_longitude / count, 6), count])
+        return clusters, branch_ids
+
+
+def request_map_rebuild():
+    """Просит все процессы перечитать индекс карты целиком при следующей смене версии филиалов.
+
+    Нужно после изменений в обход updated_at: QuerySet.update(), SQL.
+    """
+    cache.set(REBUILD_KEY, uuid.uuid4().hex, None)
+
+
+class BranchMapIndex:
+    """Индекс кластеров в памяти процесса, который догружает только изменившиеся филиалы.
+
+    При смене версии филиалов читаются строки с updated_at не старше последней
+    загрузки и список id (чтобы заметить удаленные), а не вся таблица. Изменения без
+    updated_at ловит полная перестройка раз в MAP_FULL_REBUILD_SECONDS или по request_map_rebuild().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._index = None
+        self._watermark = None
+        self._built_at = None
+        self._rebuild_token = None
+
+    def rebuild_due(self):
+        return self._built_at is not None and time.monotonic() - self._built_at >= settings.MAP_FULL_REBUILD_SECONDS
+
+    def query(self, south, west, north, east, zoom):
+        """Кластеры и отдельные филиалы [[id, широта, долгота, адрес, телефон]] в границах"""
+        version = get_version(BRANCHES_NAMESPACE)
+        # Запрос и обновление под одной блокировкой: индекс меняется на месте
+        with self._lock:
+            if self._version != version or self.rebuild_due():
+                rebuild_token = cache.get(REBUILD_KEY)
+                if self._index is None or rebuild_token != self._rebuild_token or self.rebuild_due():
+                    self.rebuild(rebuild_token)
+                else:
+                    self.refresh()
+                self._version = version
+
+            clusters, branch_ids = self._index.query(south, west, north, east, zoom)
+            branches = []
+            for branch_id in branch_ids:
+                latitude, longitude, (address, phone) = self._index.points[branch_id]
+                branches.append([branch_id, latitude, longitude, address, phone])
+        return clusters, branches
+
+    def apply(self, rows):
+        for branch_id, street, house, phone, latitude, longitude, is_active, updated_at in rows:
+            if is_active:
+                self._index.add(branch_id, latitude, longitude, (f'{street}, {house}', phone))
+            else:
+                self._index.remove(branch_id)
+            if self._watermark is None or updated_at > self._watermark:
+                self._watermark = updated_at
+
+    def rebuild(self, rebuild_token):
+        self._index = ClusterIndex(settings.MAP_CLUSTER_MAX_ZOOM)
+        self._watermark = None
+        self.apply(Branch.objects.values_list(*BRANCH_FIELDS))
+        self._built_at = time.monotonic()
+        self._rebuild_token = rebuild_token
+
+    def refresh(self):
+        if self._watermark is not None:
+            changed = Branch.objects.filter(updated_at__gte=self._watermark - REFRESH_OVERLAP)
+            self.apply(changed.values_list(*BRANCH_FIELDS))
+
+        existing = set(Branch.objects.values_list('id', flat=True))
+        for branch_id in set(self._index.points) - existing:
+            self._index.remove(branch_id)
+
+
+branch_map_index = BranchMapIndex()
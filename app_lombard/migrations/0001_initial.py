@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:23
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=100, verbose_name='Город')),
+                ('street', models.CharField(max_length=200, verbose_name='Улица')),
+                ('house', models.CharField(max_length=10, verbose_name='Дом')),
+                ('phone', models.CharField(max_length=20, validators=[django.core.validators.RegexValidator(message='Телефон должен быть в формате +7XXXXXXXXXX или 8XXXXXXXXXX', regex='^(\\+7|8)[0-9]{10}$')], verbose_name='Телефон')),
+                ('description', models.TextField(blank=True, verbose_name='Описание')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активный')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('latitude', models.FloatField(verbose_name='Широта')),
+                ('longitude', models.FloatField(verbose_name='Долгота')),
+            ],
+            options={
+                'verbose_name': 'Филиал',
+                'verbose_name_plural': 'Филиалы',
+                'ordering': ['city', 'street'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MetalPrice',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('metal_type', models.CharField(choices=[('gold', 'Золото'), ('silver', 'Серебро')], max_length=10, verbose_name='Тип металла')),
+                ('sample', models.IntegerField(help_text='375, 500, 585, 750, 850, 925', verbose_name='Проба')),
+                ('price_per_gram', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Цена за грамм (руб.)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Цена металла',
+                'verbose_name_plural': 'Цены металлов',
+                'ordering': ['metal_type', 'sample'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_of_week', models.IntegerField(choices=[(0, 'Понедельник'), (1, 'Вторник'), (2, 'Среда'), (3, 'Четверг'), (4, 'Пятница'), (5, 'Суббота'), (6, 'Воскресенье')], verbose_name='День недели')),
+                ('opening_time', models.TimeField(blank=True, null=True, verbose_name='Время открытия')),
+                ('closing_time', models.TimeField(blank=True, null=True, verbose_name='Время закрытия')),
+                ('is_closed', models.BooleanField(default=False, verbose_name='Выходной')),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='app_lombard.branch', verbose_name='Филиал')),
+            ],
+            options={
+                'verbose_name': 'Режим работы',
+                'verbose_name_plural': 'Режимы работы',
+                'ordering': ['branch', 'day_of_week'],
+                'unique_together': {('branch', 'day_of_week')},
+            },
+        ),
+    ]
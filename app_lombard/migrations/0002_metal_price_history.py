@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-17 02:26
+
+import django.core.validators
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def move_prices_to_history(apps, schema_editor):
+    """Переносит текущие цены в историю и убирает дубли перед уникальным ключом"""
+    MetalPrice = apps.get_model('app_lombard', 'MetalPrice')
+    MetalPriceHistory = apps.get_model('app_lombard', 'MetalPriceHistory')
+
+    latest = {}
+    for price in MetalPrice.objects.order_by('created_at', 'id'):
+        latest[(price.metal_type, price.sample)] = price
+
+    MetalPriceHistory.objects.bulk_create([
+        MetalPriceHistory(
+            metal_type=price.metal_type,
+            sample=price.sample,
+            price_per_gram=price.price_per_gram,
+            effective_at=price.created_at,
+        )
+        for price in latest.values()
+    ])
+    MetalPrice.objects.exclude(id__in=[price.id for price in latest.values()]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_lombard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetalPriceHistory',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('metal_type', models.CharField(choices=[('gold', 'Золото'), ('silver', 'Серебро')], max_length=10, verbose_name='Тип металла')),
+                ('sample', models.IntegerField(verbose_name='Проба')),
+                ('price_per_gram', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(0)], verbose_name='Цена за грамм (руб.)')),
+                ('effective_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Действует с')),
+            ],
+            options={
+                'verbose_name': 'История цены',
+                'verbose_name_plural': 'История цен',
+                'ordering': ['metal_type', 'sample', 'effective_at'],
+                'indexes': [models.Index(fields=['metal_type', 'sample', 'effective_at'], name='metal_price_history_idx')],
+            },
+        ),
+        migrations.RunPython(move_prices_to_history, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='metalprice',
+            unique_together={('metal_type', 'sample')},
+        ),
+    ]
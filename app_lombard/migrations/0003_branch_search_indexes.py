@@ -0,0 +1,43 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+from django.db.models.functions import Upper
+
+# Выражение полнотекстового индекса должно совпадать с SEARCH_VECTOR в branch_search.py,
+# иначе PostgreSQL не сможет использовать индекс
+SEARCH_INDEXES = [
+    GinIndex(SearchVector('city', 'street', config='russian'), name='branch_search_vector_idx'),
+    GinIndex(OpClass('city', name='gin_trgm_ops'), name='branch_city_trgm_idx'),
+    GinIndex(OpClass('street', name='gin_trgm_ops'), name='branch_street_trgm_idx'),
+    # Номер дома сравнивается через house__iexact: без индекса условие OR не сможет использовать остальные
+    models.Index(Upper('house'), name='branch_house_upper_idx'),
+]
+
+
+def add_search_indexes(apps, schema_editor):
+    """Индексы поиска есть только в PostgreSQL; на SQLite поиск работает без них"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    Branch = apps.get_model('app_lombard', 'Branch')
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Branch, index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Branch = apps.get_model('app_lombard', 'Branch')
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Branch, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_lombard', '0002_metal_price_history'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
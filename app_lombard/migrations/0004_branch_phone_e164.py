@@ -0,0 +1,44 @@
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def backfill_phones(apps, schema_editor):
+    """Заполняет номер в E.164 и формат для показа у существующих филиалов"""
+    # Та же логика, что normalize_phone/format_phone в models.py: миграция не должна зависеть от кода модели
+    Branch = apps.get_model('app_lombard', 'Branch')
+    branches = []
+    for branch in Branch.objects.only('id', 'phone').iterator(chunk_size=BATCH_SIZE):
+        digits = ''.join(filter(str.isdigit, branch.phone or ''))
+        if len(digits) == 11 and digits[0] in '78':
+            digits = digits[1:]
+        if len(digits) == 10:
+            branch.phone_e164 = f'+7{digits}'
+            branch.phone_display = f'+7 ({digits[0:3]}) {digits[3:6]}-{digits[6:8]}-{digits[8:]}'
+        else:
+            branch.phone_e164 = ''
+            branch.phone_display = (branch.phone or '').strip()
+        branches.append(branch)
+    Branch.objects.bulk_update(branches, ['phone_e164', 'phone_display'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_lombard', '0003_branch_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12,
+                                   verbose_name='Телефон (E.164)'),
+        ),
+        migrations.AddField(
+            model_name='branch',
+            name='phone_display',
+            field=models.CharField(blank=True, editable=False, max_length=25, verbose_name='Телефон для показа'),
+        ),
+        migrations.RunPython(backfill_phones, migrations.RunPython.noop),
+    ]
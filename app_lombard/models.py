@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import ExtractHour, ExtractMinute
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.core.validators import RegexValidator, MinValueValidator
@@ -10,6 +11,24 @@ phone_validator = RegexValidator(
     message='Телефон должен быть в формате +7XXXXXXXXXX или 8XXXXXXXXXX'
 )
 
+
+def normalize_phone(value):
+    """Номер в формате E.164 (+7XXXXXXXXXX) или '', если это не российский номер"""
+    digits = ''.join(filter(str.isdigit, value or ''))
+    if len(digits) == 11 and digits[0] in '78':
+        digits = digits[1:]
+    return f'+7{digits}' if len(digits) == 10 else ''
+
+
+def format_phone(value):
+    """Номер для показа: +7 (XXX) XXX-XX-XX; нераспознанный номер — как есть"""
+    e164 = normalize_phone(value)
+    if not e164:
+        return (value or '').strip()
+    digits = e164[2:]
+    return f'+7 ({digits[0:3]}) {digits[3:6]}-{digits[6:8]}-{digits[8:]}'
+
+
 class WorkingHours(models.Model):
     """Расписание"""
     DAYS_OF_WEEK = [
@@ -47,6 +66,12 @@ class WorkingHours(models.Model):
             if self.opening_time >= self.closing_time:
                 raise ValidationError('Время открытия должно быть раньше времени закрытия')
 
+    def is_open_at(self, current_time):
+        """Проверяет, открыт ли филиал в указанное время этого дня (в минуту закрытия уже закрыт)"""
+        if self.is_closed or not self.opening_time or not self.closing_time:
+            return False
+        return self.opening_time <= current_time < self.closing_time
+
     def __str__(self):
         if self.is_closed:
             return f"{self.get_day_of_week_display()}: выходной"
@@ -54,6 +79,51 @@ class WorkingHours(models.Model):
         return f"{self.get_day_of_week_display()}: {self.opening_time.strftime('%H:%M')} - {self.closing_time.strftime('%H:%M')}"
 
 
+class BranchQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create не вызывает save(), поэтому производные поля телефона заполняем здесь
+        objs = list(objs)
+        for branch in objs:
+            branch.fill_phone_fields()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'phone' in fields:
+            objs = list(objs)
+            for branch in objs:
+                branch.fill_phone_fields()
+            fields = [*fields, *Branch.PHONE_FIELDS]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def with_schedule(self):
+        """Подгружает расписание одним запросом на весь список филиалов"""
+        return self.prefetch_related('working_hours')
+
+    def with_open_status(self, when=None):
+        """Добавляет open_now и minutes_until_close (None, если закрыт) на момент when по Москве.
+
+        Считается в SQL по расписанию текущего дня, поэтому по статусу можно
+        фильтровать и сортировать: .with_open_status().filter(open_now=True).
+        Как и в индексе расписаний, время закрытия в интервал не входит.
+        """
+        local = timezone.localtime(when).replace(second=0, microsecond=0)
+        today = WorkingHours.objects.filter(
+            branch=models.OuterRef('pk'),
+            day_of_week=local.weekday(),
+            is_closed=False,
+            opening_time__lte=local.time(),
+            closing_time__gt=local.time(),
+        )
+        closes_at = today.annotate(
+            minute=ExtractHour('closing_time') * 60 + ExtractMinute('closing_time')
+        ).values('minute')[:1]
+        return self.annotate(
+            open_now=models.Exists(today),
+            minutes_until_close=models.Subquery(closes_at, output_field=models.IntegerField())
+            - (local.hour * 60 + local.minute),
+        )
+
+
 class Branch(models.Model):
     """Филиалы"""
     id = models.AutoField(primary_key=True, verbose_name='ID')
@@ -65,6 +135,10 @@ class Branch(models.Model):
         verbose_name='Телефон',
         validators=[phone_validator]
     )
+    # Заполняются из phone при сохранении: поиск филиала по входящему номеру и показ без разбора строки
+    phone_e164 = models.CharField(max_length=12, blank=True, db_index=True, editable=False,
+                                  verbose_name='Телефон (E.164)')
+    phone_display = models.CharField(max_length=25, blank=True, editable=False, verbose_name='Телефон для показа')
     description = models.TextField(verbose_name="Описание", blank=True)
     is_active = models.BooleanField(default=True, verbose_name="Активный")
     created_at = models.DateTimeField(
@@ -80,6 +154,10 @@ class Branch(models.Model):
     latitude = models.FloatField(verbose_name='Широта')
     longitude = models.FloatField(verbose_name='Долгота')
 
+    objects = BranchQuerySet.as_manager()
+
+    PHONE_FIELDS = ('phone_e164', 'phone_display')
+
     class Meta:
         verbose_name = 'Филиал'
         verbose_name_plural = 'Филиалы'
@@ -88,32 +166,44 @@ class Branch(models.Model):
     def __str__(self):
         return f"{self.city}, {self.street}, {self.house}"
 
-    def get_formatted_phone(self):
-        """Возвращает отформатированный номер телефона"""
-        phone = self.phone.strip()
-
-        # Убираем все нецифровые символы
-        digits = ''.join(filter(str.isdigit, phone))
+    def save(self, *args, **kwargs):
+        self.fill_phone_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *self.PHONE_FIELDS}
+        super().save(*args, **kwargs)
 
-        # Форматируем номер
-        if len(digits) == 11:
-            if digits.startswith('8'):
-                return f'+7 ({digits[1:4]}) {digits[4:7]}-{digits[7:9]}-{digits[9:]}'
-            elif digits.startswith('7'):
-                return f'+7 ({digits[1:4]}) {digits[4:7]}-{digits[7:9]}-{digits[9:]}'
-        elif len(digits) == 10:
-            return f'+7 ({digits[0:3]}) {digits[3:6]}-{digits[6:8]}-{digits[8:]}'
+    def fill_phone_fields(self):
+        """Заполняет номер в E.164 и формат для показа по полю phone"""
+        self.phone_e164 = normalize_phone(self.phone)
+        self.phone_display = format_phone(self.phone)
 
-        # Если не удалось отформатировать, возвращаем как есть
-        return phone
+    def get_formatted_phone(self):
+        """Возвращает отформатированный номер телефона (сохраненный вместе с филиалом)"""
+        return self.phone_display or format_phone(self.phone)
 
     def get_address(self):
         """Возвращает полный адрес"""
         return f"{self.street}, {self.house}"
 
+    def get_schedule(self):
+        """Возвращает расписание по дням недели.
+
+        Использует prefetch_related('working_hours'), если он был сделан,
+        поэтому в списках филиалов не порождает запросов на каждый филиал.
+        """
+        return sorted(self.working_hours.all(), key=lambda wh: wh.day_of_week)
+
+    def get_hours_for_day(self, day_of_week):
+        """Возвращает режим работы на указанный день недели или None"""
+        for wh in self.get_schedule():
+            if wh.day_of_week == day_of_week:
+                return wh
+        return None
+
     def get_working_hours_display(self):
         """Возвращает отформатированное представление режима работы"""
-        hours = self.working_hours.all()
+        hours = self.get_schedule()
         if not hours:
             return "Режим работы не установлен"
 
@@ -121,17 +211,9 @@ class Branch(models.Model):
 
     def is_open_now(self):
         """Проверяет, открыт ли филиал в текущий момент"""
-        now = timezone.now()
-        today = now.weekday()
-        current_time = now.time()
-
-        try:
-            today_hours = self.working_hours.get(day_of_week=today)
-            if today_hours.is_closed:
-                return False
-            return today_hours.opening_time <= current_time <= today_hours.closing_time
-        except WorkingHours.DoesNotExist:
-            return False
+        now = timezone.localtime()
+        today_hours = self.get_hours_for_day(now.weekday())
+        return today_hours is not None and today_hours.is_open_at(now.time())
 
 
 class MetalPrice(models.Model):
@@ -140,6 +222,8 @@ class MetalPrice(models.Model):
         ('gold', 'Золото'),
         ('silver', 'Серебро'),
     ]
+    GOLD_SAMPLES = [375, 500, 585, 750, 850]
+    SILVER_SAMPLES = [925]
 
     id = models.AutoField(primary_key=True, verbose_name='ID')
     metal_type = models.CharField(
@@ -166,8 +250,7 @@ class MetalPrice(models.Model):
         verbose_name = 'Цена металла'
         verbose_name_plural = 'Цены металлов'
         ordering = ['metal_type', 'sample']
-        # УБРАТЬ ЭТУ СТРОКУ полностью:
-        # unique_together = ['metal_type', 'sample']
+        unique_together = ['metal_type', 'sample']
 
     def __str__(self):
         return f"{self.get_metal_type_display()} {self.sample} - {self.price_per_gram} руб./г"
@@ -175,8 +258,79 @@ class MetalPrice(models.Model):
     @classmethod
     def get_current_prices_dict(cls):
         """Получить текущие цены в виде словаря"""
+        from .price_board import get_price_board
+
+        return dict(get_price_board()['prices'])
+
+    @classmethod
+    def board_keys(cls):
+        """Все пары (металл, проба), которые показываются на табло"""
+        return [('gold', sample) for sample in cls.GOLD_SAMPLES] + \
+            [('silver', sample) for sample in cls.SILVER_SAMPLES]
+
+
+class MetalPriceHistoryQuerySet(models.QuerySet):
+    def as_of(self, moment):
+        """Цены, действовавшие в момент moment: {"gold_585": цена, ...}.
+
+        Для каждой пробы — один поиск по индексу (metal_type, sample, effective_at).
+        """
         prices = {}
-        for price in cls.objects.all():
-            key = f"{price.metal_type}_{price.sample}"
-            prices[key] = price.price_per_gram
-        return prices
\ No newline at end of file
+        for metal_type, sample in MetalPrice.board_keys():
+            record = (
+                self.filter(metal_type=metal_type, sample=sample, effective_at__lte=moment)
+                .order_by('-effective_at', '-id')
+                .values_list('price_per_gram', flat=True)
+                .first()
+            )
+            if record is not None:
+                prices[f"{metal_type}_{sample}"] = record
+        return prices
+
+    def series(self, metal_type, sample, start=None, end=None):
+        """Компактный ряд [(effective_at, цена)] для графика за период"""
+        records = self.filter(metal_type=metal_type, sample=sample)
+        if start is not None:
+            records = records.filter(effective_at__gte=start)
+        if end is not None:
+            records = records.filter(effective_at__lte=end)
+        return records.order_by('effective_at', 'id').values_list('effective_at', 'price_per_gram')
+
+
+class MetalPriceHistory(models.Model):
+    """История цен на пробы (записи только добавляются)"""
+    id = models.AutoField(primary_key=True, verbose_name='ID')
+    metal_type = models.CharField(
+        max_length=10,
+        choices=MetalPrice.METAL_CHOICES,
+        verbose_name='Тип металла'
+    )
+    sample = models.IntegerField(verbose_name='Проба')
+    price_per_gram = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name='Цена за грамм (руб.)',
+        validators=[MinValueValidator(0)]
+    )
+    effective_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Действует с'
+    )
+
+    objects = MetalPriceHistoryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'История цены'
+        verbose_name_plural = 'История цен'
+        ordering = ['metal_type', 'sample', 'effective_at']
+        indexes = [
+            models.Index(fields=['metal_type', 'sample', 'effective_at'], name='metal_price_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_metal_type_display()} {self.sample} - {self.price_per_gram} руб./г ({self.effective_at:%d.%m.%Y %H:%M})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError('История цен не редактируется, добавьте новую запись')
+        super().save(*args, **kwargs)
@@ -0,0 +1,56 @@
+import uuid
+
+from django.db.models import Count
+
+from .models import Branch
+from .schedule_index import get_schedule_index, minute_of_week, schedule_index
+from .snapshots import BRANCHES_NAMESPACE, VersionedSnapshot
+
+
+def build_network_stats():
+    """Счетчики активных филиалов: всего и по городам (два запроса на версию данных)"""
+    active = Branch.objects.filter(is_active=True).order_by()
+    cities = dict(active.values_list('city').annotate(count=Count('id')).order_by('city'))
+    return {
+        # Метка снимка: по ней кэшируется число открытых филиалов на минуту
+        'token': uuid.uuid4().hex,
+        'total_active': sum(cities.values()),
+        'cities': cities,
+        'active_ids': frozenset(active.values_list('id', flat=True)),
+    }
+
+
+network_stats = VersionedSnapshot('network_stats', BRANCHES_NAMESPACE, build_network_stats)
+
+# (метка снимка, минута недели, число открытых): статус меняется не чаще раза в минуту
+_open_now = (None, None, 0)
+
+
+def count_open_now(stats, index, when=None):
+    """Сколько активных филиалов открыто сейчас; считается один раз на минуту"""
+    global _open_now
+    minute, _ = minute_of_week(when)
+    token, cached_minute, count = _open_now
+    if token != stats['token'] or cached_minute != minute:
+        count = len(index.open_ids_at(when, branch_ids=stats['active_ids']))
+        _open_now = (stats['token'], minute, count)
+    return count
+
+
+def with_open_now(stats, index, when=None):
+    return {
+        'total_active': stats['total_active'],
+        'city_count': len(stats['cities']),
+        'cities': stats['cities'],
+        'open_now': count_open_now(stats, index, when),
+    }
+
+
+def get_network_stats(when=None):
+    """Статистика сети филиалов: total_active, city_count, cities {город: филиалов}, open_now"""
+    return with_open_now(network_stats.get(), get_schedule_index(), when)
+
+
+async def aget_network_stats(when=None):
+    """Асинхронная версия get_network_stats()"""
+    return with_open_now(await network_stats.aget(), await schedule_index.aget(), when)
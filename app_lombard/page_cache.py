@@ -0,0 +1,69 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .snapshots import aget_version, get_version
+
+PAGE_KEY = 'lombard:page:{name}:{versions}'
+
+
+def get_page_ttl(name):
+    """Время жизни страницы в кэше из PAGE_CACHE_TTL; 0 — не кэшировать"""
+    return getattr(settings, 'PAGE_CACHE_TTL', {}).get(name, 0)
+
+
+def cacheable(response):
+    # Кэшируем только обычные успешные ответы без cookie
+    return response.status_code == 200 and not response.streaming and not response.cookies
+
+
+def cache_page_versioned(name, namespaces=()):
+    """Кэширует ответ страницы целиком.
+
+    В ключ входят версии пространств имен, от данных которых зависит страница,
+    поэтому изменение этих данных сразу дает новую страницу, без ожидания TTL.
+    Работает и с синхронными, и с асинхронными представлениями.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                ttl = get_page_ttl(name)
+                if not ttl or request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+
+                versions = [await aget_version(namespace) for namespace in namespaces]
+                key = PAGE_KEY.format(name=name, versions=':'.join(versions))
+                cached = await cache.aget(key)
+                if cached is not None:
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+
+                response = await view(request, *args, **kwargs)
+                if cacheable(response):
+                    await cache.aset(key, (response.content, response['Content-Type']), ttl)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            ttl = get_page_ttl(name)
+            if not ttl or request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            versions = ':'.join(get_version(namespace) for namespace in namespaces)
+            key = PAGE_KEY.format(name=name, versions=versions)
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            response = view(request, *args, **kwargs)
+            if cacheable(response):
+                cache.set(key, (response.content, response['Content-Type']), ttl)
+            return response
+        return wrapper
+    return decorator
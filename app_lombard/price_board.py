@@ -0,0 +1,81 @@
+import hashlib
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import MetalPrice, MetalPriceHistory
+from .snapshots import PRICES_NAMESPACE, VersionedSnapshot, bump_version
+
+
+def build_price_board():
+    """Строит табло цен: все пробы, дата обновления и версия содержимого"""
+    rows = MetalPrice.objects.order_by('metal_type', 'sample', 'created_at', 'id')
+
+    # При дублях по (металл, проба) побеждает самая поздняя запись
+    prices = {}
+    updated_at = None
+    for price in rows:
+        prices[(price.metal_type, price.sample)] = price.price_per_gram
+        if updated_at is None or price.created_at > updated_at:
+            updated_at = price.created_at
+
+    # Обновление существующей записи не меняет created_at, поэтому смотрим историю
+    published_at = MetalPriceHistory.objects.aggregate(Max('effective_at'))['effective_at__max']
+    if published_at and (updated_at is None or published_at > updated_at):
+        updated_at = published_at
+
+    board = {
+        'prices': {f"{metal_type}_{sample}": value for (metal_type, sample), value in prices.items()},
+        'updated_at': updated_at,
+    }
+    for metal_type, _ in MetalPrice.METAL_CHOICES:
+        board[metal_type] = [
+            {'sample': sample, 'price_per_gram': value}
+            for (metal, sample), value in sorted(prices.items())
+            if metal == metal_type
+        ]
+    board['etag'] = hashlib.sha1(repr(sorted(board['prices'].items())).encode()).hexdigest()
+    return board
+
+
+price_board = VersionedSnapshot('price_board', PRICES_NAMESPACE, build_price_board)
+
+
+def get_price_board():
+    """Возвращает актуальное табло цен"""
+    return price_board.get()
+
+
+def publish_prices(prices):
+    """Публикует цены {(металл, проба): цена} одной транзакцией.
+
+    Текущие цены обновляются, а в историю добавляется новая запись на каждую
+    пробу. Читатели табло видят либо старый, либо новый набор целиком. После фиксации
+    транзакции версия табло сдвигается, и новое табло сразу строится в кэше.
+    """
+    effective_at = timezone.now()
+    with transaction.atomic():
+        # Постоянное число запросов на любое число проб: одно чтение, bulk_update и bulk_create
+        current = list(MetalPrice.objects.select_for_update().filter(
+            metal_type__in={metal_type for metal_type, _ in prices}
+        ))
+        changed = []
+        for price in current:
+            new_price = prices.get((price.metal_type, price.sample))
+            if new_price is not None and new_price != price.price_per_gram:
+                price.price_per_gram = new_price
+                changed.append(price)
+        MetalPrice.objects.bulk_update(changed, ['price_per_gram'])
+        existing = {(price.metal_type, price.sample) for price in current}
+        MetalPrice.objects.bulk_create([
+            MetalPrice(metal_type=metal_type, sample=sample, price_per_gram=price)
+            for (metal_type, sample), price in prices.items()
+            if (metal_type, sample) not in existing
+        ])
+        MetalPriceHistory.objects.bulk_create([
+            MetalPriceHistory(metal_type=metal_type, sample=sample, price_per_gram=price, effective_at=effective_at)
+            for (metal_type, sample), price in prices.items()
+        ])
+        bump_version(PRICES_NAMESPACE)
+        transaction.on_commit(price_board.get)
@@ -0,0 +1,115 @@
+import json
+import urllib.request
+from decimal import Decimal, InvalidOperation
+
+from .models import MetalPrice
+from .price_board import get_price_board, publish_prices
+from .views.price_calculator import price_calculator, to_decimal
+
+# Изменение цены в процентах, меньше которого котировка не публикуется
+DEFAULT_THRESHOLD = Decimal('0.1')
+# Сколько секунд лента должна молчать перед публикацией и сколько максимум ждать при непрерывных тиках
+DEFAULT_DEBOUNCE = 5
+DEFAULT_MAX_WAIT = 30
+HTTP_TIMEOUT = 5
+
+
+class PriceFeedError(ValueError):
+    """Котировку не удалось получить или разобрать"""
+
+
+def read_quote(source):
+    """Базовые цены (золото 585, серебро 925) из JSON-файла или HTTP-ленты.
+
+    Формат: {"gold_585": 5500, "silver_925": 75}.
+    """
+    try:
+        if source.startswith(('http://', 'https://')):
+            with urllib.request.urlopen(source, timeout=HTTP_TIMEOUT) as response:
+                data = json.load(response)
+        else:
+            with open(source, encoding='utf-8') as f:
+                data = json.load(f)
+        gold, silver = to_decimal(str(data['gold_585'])), to_decimal(str(data['silver_925']))
+    except (OSError, ValueError, KeyError, TypeError, InvalidOperation) as e:
+        raise PriceFeedError(f'Не удалось прочитать котировку из {source}: {e}')
+
+    if not (gold.is_finite() and silver.is_finite()) or gold <= 0 or silver <= 0:
+        raise PriceFeedError('Цена должна быть больше 0')
+    return gold, silver
+
+
+def derive_prices(gold_585, silver_925):
+    """Цены всех проб {(металл, проба): цена}: золото пересчитывается от пробы 585"""
+    gold = price_calculator(gold_585)
+    prices = {('gold', sample): gold[f'proba_{sample}'] for sample in MetalPrice.GOLD_SAMPLES}
+    prices[('silver', 925)] = silver_925
+    return prices
+
+
+def board_prices():
+    """Опубликованные цены из табло в виде {(металл, проба): цена}"""
+    prices = {}
+    for key, price in get_price_board()['prices'].items():
+        metal_type, sample = key.rsplit('_', 1)
+        prices[(metal_type, int(sample))] = price
+    return prices
+
+
+def changed_beyond(old, new, threshold):
+    """Отличается ли хоть одна цена больше чем на threshold процентов (или появилась новая проба)"""
+    for key, price in new.items():
+        previous = old.get(key)
+        if not previous or abs(price - previous) * 100 > previous * threshold:
+            return True
+    return False
+
+
+class PriceFeedWorker:
+    """Публикует котировки ленты не чаще, чем нужно.
+
+    Котировки, отличающиеся от опубликованных цен меньше порога, пропускаются. Изменения
+    копятся, пока лента не затихнет на debounce секунд, но ждут не дольше max_wait секунд,
+    поэтому запись в БД и сброс кэша цен происходят не чаще раза в debounce секунд.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, debounce=DEFAULT_DEBOUNCE, max_wait=DEFAULT_MAX_WAIT,
+                 publish=publish_prices):
+        self.threshold = to_decimal(threshold)
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.publish = publish
+        self.published = None
+        self.pending = None
+        self.pending_since = self.last_change = None
+        self.received = self.skipped = self.publications = 0
+
+    def offer(self, quote, now):
+        """Принимает котировку (золото 585, серебро 925), полученную в момент now (секунды)"""
+        self.received += 1
+        # Цены могли поменять в админке или другой командой: сравниваем с табло, а не с прошлой публикацией.
+        # Табло берется из снимка, поэтому это одно чтение версии из кэша
+        self.published = board_prices()
+
+        prices = derive_prices(*quote)
+        if not changed_beyond(self.published, prices, self.threshold):
+            # Цена вернулась к опубликованной: отложенная публикация больше не нужна
+            self.pending = None
+            self.skipped += 1
+            return
+        if prices != self.pending:
+            if self.pending is None:
+                self.pending_since = now
+            self.pending = prices
+            self.last_change = now
+
+    def flush(self, now, force=False):
+        """Публикует отложенные цены, если пора; возвращает True, если цены опубликованы"""
+        if self.pending is None:
+            return False
+        if not force and now - self.last_change < self.debounce and now - self.pending_since < self.max_wait:
+            return False
+        self.publish(self.pending)
+        self.published, self.pending = self.pending, None
+        self.publications += 1
+        return True
@@ -0,0 +1,65 @@
+from decimal import Decimal, InvalidOperation, ROUND_DOWN, ROUND_HALF_UP
+
+from django.conf import settings
+
+from .models import MetalPrice
+from .price_board import get_price_board
+from .snapshots import PRICES_NAMESPACE, VersionedSnapshot
+from .views.price_calculator import to_decimal
+
+# Максимальный вес залога в граммах: больше в ломбард не принимают, а произведение
+# слишком большого веса на цену не помещается в точность Decimal
+MAX_WEIGHT = Decimal('100000')
+
+
+class QuoteError(ValueError):
+    """Расчет займа невозможен для переданных параметров"""
+
+
+def build_quote_table():
+    """Таблица {(металл, проба, срок): (сумма займа за грамм, множитель возврата)}"""
+    board = get_price_board()
+    loan_to_value = Decimal(settings.LOAN_TO_VALUE)
+    rates = {int(term): Decimal(rate) for term, rate in settings.LOAN_DAILY_RATES.items()}
+
+    table = {}
+    for metal_type, _ in MetalPrice.METAL_CHOICES:
+        for row in board[metal_type]:
+            loan_per_gram = row['price_per_gram'] * loan_to_value
+            for term, rate in rates.items():
+                table[(metal_type, row['sample'], term)] = (loan_per_gram, 1 + rate * term)
+    return table
+
+
+quote_table = VersionedSnapshot('quote_table', PRICES_NAMESPACE, build_quote_table)
+
+
+def calculate_quote(metal_type, sample, weight, term):
+    """Расчет займа под залог: сумма на руки, проценты и сумма к возврату"""
+    try:
+        sample, term, weight = int(sample), int(term), to_decimal(weight)
+    except (TypeError, ValueError, InvalidOperation):
+        raise QuoteError('Некорректные параметры расчета')
+
+    if not weight.is_finite() or weight <= 0:
+        raise QuoteError('Вес должен быть больше 0')
+    if weight > MAX_WEIGHT:
+        raise QuoteError(f'Вес не может быть больше {MAX_WEIGHT} г')
+
+    entry = quote_table.get().get((metal_type, sample, term))
+    if entry is None:
+        raise QuoteError('Нет цены для выбранной пробы или срока')
+
+    loan_per_gram, repay_factor = entry
+    loan_amount = (weight * loan_per_gram).quantize(Decimal('1'), rounding=ROUND_DOWN)
+    total = (loan_amount * repay_factor).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    return {
+        'metal': metal_type,
+        'sample': sample,
+        'weight': weight,
+        'term': term,
+        'loan_amount': loan_amount,
+        'interest': total - loan_amount,
+        'total_to_repay': total,
+    }
@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+from django.utils import timezone
+
+from .models import WorkingHours
+from .snapshots import BRANCHES_NAMESPACE, VersionedSnapshot
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+FULL_WEEK_MASK = (1 << MINUTES_PER_WEEK) - 1
+
+
+class BranchStatus(NamedTuple):
+    """Статус филиала на момент времени"""
+    is_open: bool
+    closes_in: Optional[int]  # минут до закрытия, если открыт
+    opens_at: Optional[datetime]  # ближайшее открытие, если есть рабочие дни
+
+
+def minute_of_week(when=None):
+    """Возвращает местное время в виде (минута недели, начало этой минуты)"""
+    local = timezone.localtime(when).replace(second=0, microsecond=0)
+    return local.weekday() * MINUTES_PER_DAY + local.hour * 60 + local.minute, local
+
+
+def _distance_to_set_bit(mask, minute):
+    """Сколько минут от minute до ближайшего установленного бита (по кругу недели)"""
+    shifted = mask >> minute
+    if shifted:
+        return (shifted & -shifted).bit_length() - 1
+    if mask:
+        return MINUTES_PER_WEEK - minute + (mask & -mask).bit_length() - 1
+    return None
+
+
+class ScheduleIndex:
+    """Скомпилированное недельное расписание филиалов.
+
+    Для каждого филиала хранится битовая маска минут недели (бит 1 — филиал
+    открыт). Время закрытия в интервал не входит. Все ответы — битовые операции
+    без обращения к базе.
+    """
+
+    def __init__(self, masks):
+        self.masks = masks
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Строит индекс из строк (branch_id, day_of_week, opening_time, closing_time, is_closed)"""
+        masks = {}
+        for branch_id, day, opening_time, closing_time, is_closed in rows:
+            mask = masks.setdefault(branch_id, 0)
+            if is_closed or not opening_time or not closing_time:
+                continue
+            start = day * MINUTES_PER_DAY + opening_time.hour * 60 + opening_time.minute
+            end = day * MINUTES_PER_DAY + closing_time.hour * 60 + closing_time.minute
+            if end > start:
+                masks[branch_id] = mask | (((1 << (end - start)) - 1) << start)
+        return cls(masks)
+
+    def _status(self, mask, minute, local):
+        if not mask:
+            return BranchStatus(False, None, None)
+
+        if not (mask >> minute) & 1:
+            opens_in = _distance_to_set_bit(mask, minute)
+            return BranchStatus(False, None, local + timedelta(minutes=opens_in))
+
+        closes_in = _distance_to_set_bit(~mask & FULL_WEEK_MASK, minute)
+        if closes_in is None:
+            # Круглосуточно всю неделю
+            return BranchStatus(True, None, None)
+
+        # Следующее открытие ищем уже после текущего закрытия
+        reopen_minute = (minute + closes_in) % MINUTES_PER_WEEK
+        opens_in = closes_in + _distance_to_set_bit(mask, reopen_minute)
+        return BranchStatus(True, closes_in, local + timedelta(minutes=opens_in))
+
+    def status_at(self, when=None, branch_ids=None):
+        """Возвращает {branch_id: BranchStatus} для всех (или указанных) филиалов за один проход"""
+        minute, local = minute_of_week(when)
+        ids = self.masks.keys() if branch_ids is None else branch_ids
+        return {
+            branch_id: self._status(self.masks.get(branch_id, 0), minute, local)
+            for branch_id in ids
+        }
+
+    def open_ids_at(self, when=None, branch_ids=None):
+        """Возвращает множество id филиалов, открытых в указанный момент"""
+        minute, _ = minute_of_week(when)
+        ids = self.masks.keys() if branch_ids is None else branch_ids
+        return {
+            branch_id for branch_id in ids
+            if (self.masks.get(branch_id, 0) >> minute) & 1
+        }
+
+    def is_open_at(self, branch_id, when=None):
+        """Открыт ли филиал в указанный момент"""
+        minute, _ = minute_of_week(when)
+        return bool((self.masks.get(branch_id, 0) >> minute) & 1)
+
+    def next_opening(self, branch_id, when=None):
+        """Ближайшее время открытия (если филиал открыт — после текущего закрытия)"""
+        return self.status_at(when, [branch_id])[branch_id].opens_at
+
+    def minutes_until_close(self, branch_id, when=None):
+        """Минут до закрытия или None, если филиал сейчас закрыт"""
+        return self.status_at(when, [branch_id])[branch_id].closes_in
+
+
+def build_schedule_index():
+    """Строит индекс расписаний всех филиалов одним запросом"""
+    rows = WorkingHours.objects.order_by().values_list(
+        'branch_id', 'day_of_week', 'opening_time', 'closing_time', 'is_closed'
+    )
+    return ScheduleIndex.from_rows(rows)
+
+
+schedule_index = VersionedSnapshot('schedule_index', BRANCHES_NAMESPACE, build_schedule_index)
+
+
+def get_schedule_index():
+    """Возвращает актуальный индекс расписаний"""
+    return schedule_index.get()
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .branch_directory import invalidate_branch_directory
+from .models import Branch, MetalPrice, WorkingHours
+from .snapshots import PRICES_NAMESPACE, bump_version
+
+
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_delete, sender=WorkingHours)
+def branches_changed(sender, **kwargs):
+    """Любое изменение филиала или расписания сбрасывает справочник"""
+    invalidate_branch_directory()
+
+
+@receiver(post_save, sender=MetalPrice)
+@receiver(post_delete, sender=MetalPrice)
+def prices_changed(sender, **kwargs):
+    """Изменение или удаление цены сбрасывает табло цен"""
+    bump_version(PRICES_NAMESPACE)
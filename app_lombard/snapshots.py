@@ -0,0 +1,102 @@
+import threading
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+VERSION_KEY = 'lombard:version:{namespace}'
+SNAPSHOT_KEY = 'lombard:snapshot:{name}:{version}'
+
+# Филиалы и их расписание
+BRANCHES_NAMESPACE = 'branches'
+# Цены на пробы металлов
+PRICES_NAMESPACE = 'prices'
+
+
+def cache_is_process_local():
+    """Кэш виден только текущему процессу: версии, сдвинутые отдельной командой, не дойдут до сайта"""
+    return isinstance(caches['default'], LocMemCache)
+
+
+def get_version(namespace):
+    """Возвращает текущую версию данных пространства имен"""
+    key = VERSION_KEY.format(namespace=namespace)
+    version = cache.get(key)
+    if version is None:
+        # Первое обращение (или сброс кэша): заводим новую версию
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(namespace):
+    """Асинхронная версия get_version()"""
+    key = VERSION_KEY.format(namespace=namespace)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, uuid.uuid4().hex, None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(namespace):
+    """Сдвигает версию пространства имен после фиксации транзакции"""
+    key = VERSION_KEY.format(namespace=namespace)
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+class VersionedSnapshot:
+    """Снимок данных, который строится один раз на версию.
+
+    Хранится в памяти процесса и в общем кэше, поэтому при неизменной версии
+    обращение стоит одного чтения ключа версии из кэша.
+    """
+
+    def __init__(self, name, namespace, builder, timeout=None):
+        self.name = name
+        self.namespace = namespace
+        self.builder = builder
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = None
+
+    def get(self):
+        """Возвращает снимок для текущей версии, при необходимости строит его"""
+        version = get_version(self.namespace)
+        if self._version == version:
+            return self._data
+
+        with self._lock:
+            if self._version != version:
+                key = SNAPSHOT_KEY.format(name=self.name, version=version)
+                data = cache.get(key)
+                if data is None:
+                    data = self.builder()
+                    cache.set(key, data, self.timeout)
+                self._data, self._version = data, version
+            return self._data
+
+    async def aget(self):
+        """Асинхронная версия get() для async-представлений.
+
+        Без блокировки: при одновременном промахе снимок может построиться
+        дважды, но цикл событий не блокируется. Построение идет через синхронный ORM.
+        """
+        version = await aget_version(self.namespace)
+        if self._version == version:
+            return self._data
+
+        key = SNAPSHOT_KEY.format(name=self.name, version=version)
+        data = await cache.aget(key)
+        if data is None:
+            data = await sync_to_async(self.builder)()
+            await cache.aset(key, data, self.timeout)
+        self._data, self._version = data, version
+        return data
+
+    def invalidate(self):
+        """Сбрасывает снимок (вместе со всем пространством имен)"""
+        bump_version(self.namespace)
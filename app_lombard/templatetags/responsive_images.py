@@ -0,0 +1,58 @@
+from urllib.parse import urljoin
+
+from django import template
+from django.conf import settings
+from django.forms.utils import flatatt
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from ..images import MIME_TYPES, get_image_entry
+
+register = template.Library()
+
+DEFAULT_SIZES = '100vw'
+
+
+def variant_url(name):
+    # Имена вариантов уже содержат хэш, поэтому хэширующее хранилище статики не нужно
+    return urljoin(settings.STATIC_URL, name)
+
+
+def build_srcset(variants):
+    return ', '.join(f'{variant_url(name)} {width}w' for width, name in variants)
+
+
+@register.simple_tag
+def responsive_image(path, alt='', sizes=DEFAULT_SIZES, **attrs):
+    """<picture> с AVIF/WebP/JPEG нужных ширин для картинки из статики.
+
+    Пример: {% responsive_image 'branches.jpg' alt='Филиалы' sizes='50vw' class='quadrant-image' %}
+    Если вариантов нет (разработка или collectstatic не запускался) — обычный <img>.
+    """
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+
+    entry = get_image_entry(path)
+    # Без JPEG-вариантов (манифест от старых настроек) не из чего собрать запасной <img>
+    if entry is None or not entry['variants'].get('jpeg'):
+        return format_html('<img src="{}" alt="{}"{}>', static(path), alt, flatatt(attrs))
+
+    variants = entry['variants']
+    # Запасной <img> — JPEG шириной ближе всего к 960px, его поймет любой браузер
+    fallback = min(variants['jpeg'], key=lambda variant: abs(variant[0] - 960))
+    sources = format_html_join(
+        '',
+        '<source type="{}" srcset="{}" sizes="{}">',
+        ((MIME_TYPES[fmt], build_srcset(items), sizes) for fmt, items in variants.items() if fmt != 'jpeg'),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}"{}></picture>',
+        sources,
+        variant_url(fallback[1]),
+        build_srcset(variants['jpeg']),
+        sizes,
+        entry['width'],
+        entry['height'],
+        alt,
+        flatatt(attrs),
+    )
@@ -1,3 +1,865 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.http import HttpResponse
+from django.contrib.auth.models import User
+from django.template import Context, RequestContext, Template
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .branch_directory import invalidate_branch_directory
+from .branch_io import BranchImporter, read_records
+from .branch_search import search_queryset
+from .geo import KDTree, haversine_km, to_unit_vector
+from .images import generate_responsive_images, load_manifest
+from .map_clusters import ClusterIndex, request_map_rebuild
+from .instrumentation import metrics_store
+from .models import Branch, MetalPrice, MetalPriceHistory, WorkingHours, normalize_phone
+from .network_stats import get_network_stats
+from .price_board import get_price_board, publish_prices
+from .price_feed import PriceFeedWorker
+from .schedule_index import build_schedule_index
+from .snapshots import PRICES_NAMESPACE, VERSION_KEY
+from .views import api, base, branches
+from .views.price_calculator import batch_price_calculator, price_calculator
+
+
+def shared_cache(directory):
+    """Общий для процессов кэш: с ним работают команды, сбрасывающие данные сайта"""
+    return {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(directory, 'cache'),
+    }}
+
+
+def create_branches(count, city='Кострома'):
+    """Создает филиалы с полным недельным расписанием"""
+    branches = Branch.objects.bulk_create([
+        Branch(
+            city=city,
+            street=f'Улица {i}',
+            house=str(i),
+            phone='+74942123456',
+            latitude=57.7 + i / 10000,
+            longitude=40.9 + i / 10000,
+        )
+        for i in range(count)
+    ])
+    WorkingHours.objects.bulk_create([
+        WorkingHours(
+            branch=branch,
+            day_of_week=day,
+            opening_time=None if day == 6 else datetime.time(9, 0),
+            closing_time=None if day == 6 else datetime.time(19, 0),
+            is_closed=day == 6,
+        )
+        for branch in branches
+        for day in range(7)
+    ])
+    return branches
+
+
+class BranchesQueryCountTests(TestCase):
+    def count_branches_view_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('branches'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_branches(self):
+        create_branches(1)
+        one_branch = self.count_branches_view_queries()
+
+        create_branches(999, city='Ярославль')
+        many_branches = self.count_branches_view_queries()
+
+        self.assertEqual(one_branch, many_branches)
+
+    def test_is_open_now_uses_prefetched_schedule(self):
+        create_branches(10)
+        branches = list(Branch.objects.with_schedule())
+
+        with self.assertNumQueries(0):
+            for branch in branches:
+                branch.is_open_now()
+                branch.get_working_hours_display()
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_static_page_is_served_from_cache(self):
+        self.client.get(reverse('conditions'))
+        with patch('app_lombard.views.conditions.render') as render:
+            response = self.client.get(reverse('conditions'))
+        render.assert_not_called()
+        self.assertContains(response, 'Ломбард Народный')
+
+    @override_settings(PAGE_CACHE_TTL={})
+    def test_page_cache_can_be_disabled(self):
+        self.client.get(reverse('conditions'))
+        with patch('app_lombard.views.conditions.render', return_value=HttpResponse('fresh')):
+            response = self.client.get(reverse('conditions'))
+        self.assertEqual(response.content, b'fresh')
+
+    def test_about_us_is_reset_by_branch_changes(self):
+        create_branches(2)
+        self.assertEqual(self.client.get(reverse('about_us')).context['active_branches_count'], 2)
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse('about_us'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_branches(1, city='Ярославль')[0].save()
+        self.assertEqual(self.client.get(reverse('about_us')).context['active_branches_count'], 3)
+
+    def test_branch_card_follows_schedule_changes(self):
+        branch = create_branches(1)[0]
+        self.assertContains(self.client.get(reverse('branches')), '09:00 - 19:00')
+
+        # Сам филиал не меняется (updated_at тот же), меняется только расписание
+        monday = branch.get_hours_for_day(0)
+        monday.opening_time = datetime.time(8, 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            monday.save()
+        self.assertContains(self.client.get(reverse('branches')), '08:00 - 19:00')
+
+
+class ScheduleIndexTests(TestCase):
+    moscow = ZoneInfo('Europe/Moscow')
+
+    def setUp(self):
+        self.branch = create_branches(1)[0]
+        saturday = WorkingHours.objects.get(branch=self.branch, day_of_week=5)
+        saturday.opening_time = datetime.time(10, 0)
+        saturday.closing_time = datetime.time(17, 0)
+        saturday.save()
+        self.index = build_schedule_index()
+
+    def at(self, *args):
+        return datetime.datetime(*args, tzinfo=self.moscow)
+
+    def test_open_status_uses_moscow_time(self):
+        # Понедельник 06:30 UTC — это 09:30 по Москве
+        monday_utc = datetime.datetime(2025, 1, 6, 6, 30, tzinfo=datetime.timezone.utc)
+        status = self.index.status_at(monday_utc)[self.branch.id]
+
+        self.assertTrue(status.is_open)
+        self.assertEqual(status.closes_in, 9 * 60 + 30)
+        self.assertEqual(status.opens_at, self.at(2025, 1, 7, 9, 0))
+
+    def test_closing_time_is_exclusive(self):
+        self.assertTrue(self.index.is_open_at(self.branch.id, self.at(2025, 1, 11, 16, 59)))
+        self.assertFalse(self.index.is_open_at(self.branch.id, self.at(2025, 1, 11, 17, 0)))
+
+        # Модель, индекс и аннотация with_open_status считают минуту закрытия одинаково
+        saturday = self.branch.get_hours_for_day(5)
+        self.assertTrue(saturday.is_open_at(datetime.time(16, 59)))
+        self.assertFalse(saturday.is_open_at(datetime.time(17, 0)))
+        for moment in (self.at(2025, 1, 11, 10, 0), self.at(2025, 1, 11, 17, 0)):
+            with patch('django.utils.timezone.now', return_value=moment):
+                branch = Branch.objects.with_open_status(moment).get()
+                self.assertEqual(branch.is_open_now(), branch.open_now)
+
+    def test_next_opening_skips_day_off(self):
+        sunday = self.at(2025, 1, 12, 12, 0)
+
+        self.assertEqual(self.index.next_opening(self.branch.id, sunday), self.at(2025, 1, 13, 9, 0))
+        self.assertIsNone(self.index.minutes_until_close(self.branch.id, sunday))
+        self.assertEqual(self.index.open_ids_at(sunday), set())
+
+    def test_sql_open_status_matches_index(self):
+        create_branches(2)
+        moments = [self.at(2025, 1, 6, 8, 59), self.at(2025, 1, 6, 9, 0), self.at(2025, 1, 11, 16, 59),
+                   self.at(2025, 1, 11, 17, 0), self.at(2025, 1, 12, 12, 0)]
+        for moment in moments:
+            index = build_schedule_index()
+            branches = Branch.objects.with_open_status(moment)
+            self.assertEqual({b.id for b in branches if b.open_now}, index.open_ids_at(moment))
+            statuses = index.status_at(moment)
+            for branch in branches:
+                self.assertEqual(branch.minutes_until_close, statuses[branch.id].closes_in)
+
+        saturday = Branch.objects.with_open_status(self.at(2025, 1, 11, 16, 0)).get(pk=self.branch.pk)
+        self.assertEqual(saturday.minutes_until_close, 60)
+
+    def test_admin_filters_and_sorts_by_open_status(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        url = reverse('admin:app_lombard_branch_changelist')
+        response = self.client.get(url, {'open_now': '1', 'o': '6'})
+        self.assertEqual(response.status_code, 200)
+        expected = Branch.objects.with_open_status().filter(open_now=True).count()
+        self.assertEqual(response.context['cl'].result_count, expected)
+
+
+class NetworkStatsTests(TestCase):
+    moscow = ZoneInfo('Europe/Moscow')
+
+    def setUp(self):
+        cache.clear()
+        create_branches(3)
+        create_branches(2, city='Ярославль')
+        Branch.objects.filter(city='Ярославль', house='1').update(is_active=False)
+
+    def test_counts_and_open_now(self):
+        monday_morning = datetime.datetime(2025, 1, 6, 10, 0, tzinfo=self.moscow)
+        sunday = datetime.datetime(2025, 1, 12, 10, 0, tzinfo=self.moscow)
+
+        stats = get_network_stats(monday_morning)
+        self.assertEqual(stats['total_active'], 4)
+        self.assertEqual(stats['cities'], {'Кострома': 3, 'Ярославль': 1})
+        self.assertEqual(stats['open_now'], 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_network_stats(sunday)['open_now'], 0)
+
+    def test_context_processor_is_lazy(self):
+        template = Template('{{ network_stats.total_active }} / {{ network_stats.city_count }}')
+        request = RequestFactory().get('/')
+        self.assertEqual(template.render(RequestContext(request)), '4 / 2')
+
+        with self.assertNumQueries(0):
+            RequestContext(request).flatten()
+
+    def test_refresh_command_catches_bulk_updates(self):
+        # В процесс-локальном кэше команда не видит снимков сайта
+        with self.assertRaises(CommandError):
+            call_command('refresh_network_stats', stdout=io.StringIO())
+
+        map_url = reverse('api_branch_map')
+        bbox = {'bbox': '57,39,58.5,41.5', 'zoom': 18}
+        # Филиалы Костромы старше запаса догрузки: индекс карты не перечитает их по updated_at
+        Branch.objects.filter(city='Кострома').update(updated_at=timezone.now() - datetime.timedelta(days=1))
+        with tempfile.TemporaryDirectory() as directory, override_settings(CACHES=shared_cache(directory)):
+            request_map_rebuild()
+            get_network_stats()
+            self.assertEqual(len(self.client.get(map_url, bbox).json()['branches']), 4)
+            Branch.objects.filter(city='Кострома').update(is_active=False)
+            self.assertEqual(get_network_stats()['total_active'], 4)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('refresh_network_stats', stdout=io.StringIO())
+            self.assertEqual(get_network_stats()['total_active'], 1)
+            self.assertEqual(len(self.client.get(map_url, bbox).json()['branches']), 1)
+
+
+class NearestBranchesTests(TestCase):
+    def test_kd_tree_matches_brute_force(self):
+        coordinates = [(55 + i * 0.37 % 5, 37 + i * 0.91 % 9) for i in range(200)]
+        tree = KDTree([to_unit_vector(*c) for c in coordinates], coordinates)
+        target = (56.1, 40.2)
+
+        expected = sorted(coordinates, key=lambda c: haversine_km(*target, *c))[:5]
+        self.assertEqual(tree.nearest(to_unit_vector(*target), 5), expected)
+
+    def test_nearest_endpoint(self):
+        create_branches(3)
+        cache.clear()
+
+        response = self.client.get(reverse('nearest_branches'), {'lat': 57.7, 'lon': 40.9, 'k': 2})
+
+        self.assertEqual(response.status_code, 200)
+        branches = response.json()['branches']
+        self.assertEqual([b['address'] for b in branches], ['Улица 0, 0', 'Улица 1, 1'])
+        self.assertLess(branches[0]['distance_km'], branches[1]['distance_km'])
+
+    def test_nearest_endpoint_requires_coordinates(self):
+        response = self.client.get(reverse('nearest_branches'), {'lat': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ApiTests(TestCase):
+    def test_branches_api_answers_not_modified(self):
+        create_branches(2)
+        cache.clear()
+
+        response = self.client.get(reverse('api_branches'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['cities'][0]['branches']), 2)
+
+        cached = self.client.get(reverse('api_branches'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_responses_are_gzipped(self):
+        create_branches(20)
+        response = self.client.get(reverse('api_branches'), headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_prices_api_etag_changes_with_prices(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            price = MetalPrice.objects.create(metal_type='gold', sample=585, price_per_gram='5000.00')
+
+        response = self.client.get(reverse('api_prices'))
+        self.assertEqual(response.json()['prices']['gold'], [{'sample': 585, 'price': '5000.00'}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            price.price_per_gram = '5100.00'
+            price.save()
+        updated = self.client.get(reverse('api_prices'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(updated.status_code, 200)
+
+
+@override_settings(BRANCHES_LAZY_MAP_THRESHOLD=3, BRANCHES_INITIAL_CARDS=2)
+class LazyBranchesMapTests(TestCase):
+    def setUp(self):
+        create_branches(5)
+        cache.clear()
+
+    def test_page_ships_first_cards_without_map_data(self):
+        response = self.client.get(reverse('branches'))
+        self.assertTrue(response.context['lazy_map'])
+        self.assertContains(response, 'data-branch-id=', count=2)
+        self.assertContains(response, 'Показать еще 3')
+        self.assertNotContains(response, 'Улица 4')
+
+        cards = self.client.get(reverse('branch_cards'), {'city': 'Кострома', 'offset': 2})
+        self.assertContains(cards, 'data-branch-id=', count=3)
+        self.assertContains(cards, 'Улица 4')
+
+
+class MapClusterTests(TestCase):
+    bbox = {'bbox': '57,40,58.5,41.5'}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cluster_index_add_remove(self):
+        index = ClusterIndex(max_zoom=10)
+        index.add(1, 57.70, 40.90, None)
+        index.add(2, 57.71, 40.91, None)
+        index.add(3, 59.00, 38.00, None)
+
+        clusters, ids = index.query(57, 40, 58, 41, zoom=6)
+        self.assertEqual(clusters, [[57.705, 40.905, 2]])
+        self.assertEqual(ids, [])
+
+        index.remove(2)
+        self.assertEqual(index.query(57, 40, 58, 41, zoom=6), ([], [1]))
+        self.assertEqual(index.query(50, 30, 60, 45, zoom=11), ([], [1, 3]))
+
+    def test_map_api_follows_branch_changes(self):
+        branches = create_branches(3)
+        response = self.client.get(reverse('api_branch_map'), {**self.bbox, 'zoom': 8})
+        self.assertEqual(response.json()['clusters'][0][2], 3)
+
+        branches[0].is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            branches[0].save()
+            branches[1].delete()
+        response = self.client.get(reverse('api_branch_map'), {**self.bbox, 'zoom': 18}).json()
+        self.assertEqual([branch[0] for branch in response['branches']], [branches[2].id])
+        self.assertEqual(response['clusters'], [])
+
+    def test_map_rebuild_catches_bulk_updates(self):
+        create_branches(3)
+        url = reverse('api_branch_map')
+        self.assertEqual(self.client.get(url, {**self.bbox, 'zoom': 8}).json()['clusters'][0][2], 3)
+
+        # update() не трогает updated_at и не шлет сигналов: догрузка изменений его не видит
+        Branch.objects.update(is_active=False)
+        self.assertEqual(self.client.get(url, {**self.bbox, 'zoom': 8}).json()['clusters'][0][2], 3)
+
+        with override_settings(MAP_FULL_REBUILD_SECONDS=0):
+            self.assertEqual(self.client.get(url, {**self.bbox, 'zoom': 8}).json()['clusters'], [])
+
+        Branch.objects.update(is_active=True)
+        request_map_rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_branch_directory()
+        self.assertEqual(self.client.get(url, {**self.bbox, 'zoom': 8}).json()['clusters'][0][2], 3)
+
+    def test_map_api_validates_bbox(self):
+        response = self.client.get(reverse('api_branch_map'), {'bbox': '58,40,57,41', 'zoom': 8})
+        self.assertEqual(response.status_code, 400)
+
+
+class BranchSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Branch.objects.bulk_create([
+            Branch(city='Кострома', street='Советская', house='10', phone='+74942123456', latitude=57.7, longitude=40.9),
+            Branch(city='Кострома', street='Мира', house='5', phone='+74942123457', latitude=57.7, longitude=40.9),
+            Branch(city='Ярославль', street='Советская', house='3', phone='+74852123456', latitude=57.6, longitude=39.8),
+            Branch(city='Ярославль', street='Ленина', house='1', phone='+74852123457', latitude=57.6, longitude=39.8,
+                   is_active=False),
+        ])
+
+    def search(self, query):
+        return self.client.get(reverse('api_branch_search'), {'q': query}).json()['branches']
+
+    def test_ranked_and_typo_tolerant(self):
+        self.assertEqual([b['address'] for b in self.search('кострома советская')], ['Советская, 10'])
+        self.assertEqual({b['city'] for b in self.search('кастрома')}, {'Кострома'})
+        self.assertEqual(len(self.search('советской')), 2)
+        self.assertEqual(self.search('ленина'), [])
+
+    def test_query_validation(self):
+        response = self.client.get(reverse('api_branch_search'), {'q': 'к'})
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Поиск по индексам pg_trgm есть только в PostgreSQL')
+    def test_postgres_indexes_and_typos(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            self.assertIsNotNone(cursor.fetchone())
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'app_lombard_branch'")
+            indexes = {row[0] for row in cursor.fetchall()}
+            cursor.execute('SHOW pg_trgm.word_similarity_threshold')
+            self.assertEqual(cursor.fetchone()[0], settings.BRANCH_SEARCH_WORD_SIMILARITY)
+        self.assertLessEqual(
+            {'branch_search_vector_idx', 'branch_city_trgm_idx', 'branch_street_trgm_idx', 'branch_house_upper_idx'},
+            indexes,
+        )
+
+        # Опечатки ловит условие по триграммам, полнотекстовый поиск — словоформы
+        self.assertEqual({b['city'] for b in self.search('кастрома')}, {'Кострома'})
+        self.assertEqual({b['city'] for b in self.search('советсая')}, {'Кострома', 'Ярославль'})
+        self.assertEqual(len(self.search('советской')), 2)
+
+        with connection.cursor() as cursor:
+            # На четырех строках планировщик выбрал бы полный просмотр таблицы
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = '\n'.join(search_queryset(Branch.objects.all(), 'кастрома').explain().splitlines())
+        self.assertIn('branch_city_trgm_idx', plan)
+        self.assertIn('branch_search_vector_idx', plan)
+
+    def test_admin_search(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        response = self.client.get(reverse('admin:app_lombard_branch_changelist'), {'q': 'Ярославл'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+class BranchPhoneTests(TestCase):
+    def test_normalize_phone(self):
+        for value in ('+7 (4942) 123-456', '8 494 212-34-56', '4942123456', '+74942123456'):
+            self.assertEqual(normalize_phone(value), '+74942123456')
+        self.assertEqual(normalize_phone('123'), '')
+
+    def test_phone_fields_filled_on_save_and_bulk(self):
+        branch = Branch.objects.create(city='Кострома', street='Мира', house='1', phone='84942123456',
+                                       latitude=57.7, longitude=40.9)
+        self.assertEqual(branch.phone_e164, '+74942123456')
+        self.assertEqual(branch.get_formatted_phone(), '+7 (494) 212-34-56')
+
+        branch.phone = '+74852000001'
+        Branch.objects.bulk_update([branch], ['phone'])
+        self.assertEqual(Branch.objects.get().phone_e164, '+74852000001')
+
+        create_branches(1)
+        self.assertEqual(Branch.objects.filter(phone_e164='+74942123456').count(), 1)
+
+    def test_lookup_by_phone(self):
+        create_branches(2)
+        url = reverse('api_branch_by_phone')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'phone': '8 (494) 212-34-56'})
+        data = response.json()
+        self.assertEqual(data['phone'], '+74942123456')
+        self.assertEqual(len(data['branches']), 2)
+        self.assertEqual(self.client.get(url, {'phone': '112'}).status_code, 400)
+
+
+class PriceBoardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_publish_warms_board(self):
+        prices = {('gold', sample): Decimal(sample * 10) for sample in MetalPrice.GOLD_SAMPLES}
+        prices[('silver', 925)] = Decimal('90')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            publish_prices(prices)
+
+        with self.assertNumQueries(0):
+            board = get_price_board()
+            response = self.client.get(reverse('prices'))
+
+        self.assertEqual(board['prices']['gold_585'], Decimal('5850.00'))
+        self.assertEqual([row['sample'] for row in response.context['gold_prices']], MetalPrice.GOLD_SAMPLES)
+        self.assertEqual(MetalPrice.get_current_prices_dict()['silver_925'], Decimal('90.00'))
+
+
+class PriceFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def publish(self, published):
+        """Публикует цены в табло и запоминает каждую публикацию"""
+        def publish(prices):
+            published.append(prices)
+            with self.captureOnCommitCallbacks(execute=True):
+                publish_prices(prices)
+        return publish
+
+    def test_worker_skips_small_changes_and_debounces(self):
+        published = []
+        worker = PriceFeedWorker(threshold='0.5', debounce=5, max_wait=20, publish=self.publish(published))
+
+        worker.offer((Decimal('5850'), Decimal('90')), now=0)
+        self.assertFalse(worker.flush(now=1))
+        self.assertTrue(worker.flush(now=5))
+        self.assertEqual(published[0][('gold', 375)], Decimal('3750'))
+
+        # Изменение меньше порога не публикуется
+        worker.offer((Decimal('5860'), Decimal('90')), now=6)
+        self.assertFalse(worker.flush(now=20))
+
+        # Непрерывные тики публикуются не позже max_wait
+        for second in range(21, 45):
+            worker.offer((Decimal(6000 + second), Decimal('90')), now=second)
+            worker.flush(now=second)
+        self.assertEqual(len(published), 2)
+        self.assertEqual(published[1][('gold', 585)], Decimal('6041'))
+
+    def test_worker_compares_with_current_board(self):
+        published = []
+        worker = PriceFeedWorker(debounce=0, publish=self.publish(published))
+        worker.offer((Decimal('5850'), Decimal('90')), now=0)
+        self.assertTrue(worker.flush(now=0))
+
+        # Цену поправили вручную: та же котировка ленты должна вернуть ее обратно
+        with self.captureOnCommitCallbacks(execute=True):
+            publish_prices({('gold', 585): Decimal('5000')})
+        worker.offer((Decimal('5850'), Decimal('90')), now=1)
+        self.assertTrue(worker.flush(now=1))
+        self.assertEqual(len(published), 2)
+        self.assertEqual(get_price_board()['prices']['gold_585'], Decimal('5850'))
+
+    def test_ingest_command_publishes_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'feed.json')
+            # Процесс-локальный кэш не донесет новую версию цен до сайта
+            with self.assertRaises(CommandError):
+                call_command('ingest_prices', path, once=True, stdout=io.StringIO())
+
+            with override_settings(CACHES=shared_cache(directory)):
+                for gold in ('5850', '5851'):
+                    with open(path, 'w', encoding='utf-8') as f:
+                        f.write(f'{{"gold_585": {gold}, "silver_925": 90}}')
+                    with self.captureOnCommitCallbacks(execute=True):
+                        call_command('ingest_prices', path, once=True, stdout=io.StringIO())
+
+                self.assertEqual(get_price_board()['prices']['gold_750'], Decimal('7500.00'))
+
+        self.assertEqual(MetalPrice.objects.count(), 6)
+        self.assertEqual(MetalPriceHistory.objects.count(), 6)
+
+
+class MetalPriceHistoryTests(TestCase):
+    def setUp(self):
+        self.moments = [datetime.datetime(2025, 1, day, 12, tzinfo=datetime.timezone.utc) for day in (1, 2, 3)]
+        MetalPriceHistory.objects.bulk_create([
+            MetalPriceHistory(metal_type='gold', sample=585, price_per_gram=price, effective_at=moment)
+            for moment, price in zip(self.moments, ['5000.00', '5100.00', '5200.00'])
+        ])
+
+    def test_as_of(self):
+        as_of = MetalPriceHistory.objects.as_of(self.moments[1] + datetime.timedelta(hours=1))
+        self.assertEqual(as_of, {'gold_585': Decimal('5100.00')})
+        self.assertEqual(MetalPriceHistory.objects.as_of(self.moments[0] - datetime.timedelta(days=1)), {})
+
+    def test_history_is_append_only(self):
+        record = MetalPriceHistory.objects.first()
+        record.price_per_gram = Decimal('1')
+        with self.assertRaises(ValidationError):
+            record.save()
+
+    def test_history_api_range(self):
+        response = self.client.get(reverse('api_price_history'), {
+            'metal': 'gold', 'sample': 585, 'from': '2025-01-02', 'to': '2025-01-02T23:59',
+        })
+        self.assertEqual(response.json()['points'], [[self.moments[1].isoformat(), '5100.00']])
+
+    def test_history_api_is_bounded(self):
+        # Без from — только последние 30 дней до to
+        response = self.client.get(reverse('api_price_history'), {'sample': 585, 'to': '2025-02-01T18:00'})
+        self.assertEqual([point[1] for point in response.json()['points']], ['5200.00'])
+
+        with patch('app_lombard.views.api.HISTORY_MAX_POINTS', 2):
+            response = self.client.get(reverse('api_price_history'), {'sample': 585, 'from': '2025-01-01'})
+        self.assertEqual([point[1] for point in response.json()['points']], ['5100.00', '5200.00'])
+        self.assertTrue(response.json()['truncated'])
+
+    def test_publish_appends_history(self):
+        publish_prices({('gold', 585): Decimal('5300.00')})
+        publish_prices({('gold', 585): Decimal('5400.00')})
+
+        self.assertEqual(MetalPrice.objects.get().price_per_gram, Decimal('5400.00'))
+        self.assertEqual(MetalPriceHistory.objects.count(), 5)
+
+
+class PriceCalculatorTests(TestCase):
+    def test_scalar_calculator_rounds_half_up(self):
+        # 1170 * 375 / 585 = 750
+        self.assertEqual(price_calculator(Decimal('1170'))['proba_375'], Decimal('750'))
+        self.assertEqual(price_calculator(Decimal('5.85'), decimals=2)['proba_375'], Decimal('3.75'))
+        # 9.36 * 500 / 585 = 8.0 — без двоичной погрешности float
+        self.assertEqual(price_calculator(9.36, decimals=1)['proba_500'], Decimal('8.0'))
+        # 2.34 * 375 / 585 = 1.5 — половина округляется вверх
+        self.assertEqual(price_calculator(Decimal('2.34'))['proba_375'], Decimal('2'))
+
+    def test_batch_calculator_custom_samples(self):
+        table = batch_price_calculator(['92.5', '185'], samples=(800, 925, 999), base_sample=925, decimals=2)
+
+        self.assertEqual(table[0], {
+            'base': Decimal('92.5'),
+            'proba_800': Decimal('80.00'),
+            'proba_925': Decimal('92.5'),
+            'proba_999': Decimal('99.90'),
+        })
+        self.assertEqual(table[1]['proba_800'], Decimal('160.00'))
+
+
+class QuoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            publish_prices({('gold', 585): Decimal('5000.00')})
+
+    def test_quote_endpoint(self):
+        response = self.client.get(reverse('price_quote'), {
+            'metal': 'gold', 'sample': 585, 'weight': '2,5', 'term': 30,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        # 2.5 г * 5000 * 0.80 = 10000, к возврату 10000 * (1 + 0.0025 * 30)
+        self.assertEqual(response.json()['loan_amount'], '10000')
+        self.assertEqual(response.json()['total_to_repay'], '10750.00')
+
+    def test_quote_needs_known_price_and_term(self):
+        for params in ({'sample': 375, 'weight': 1, 'term': 30}, {'sample': 585, 'weight': 1, 'term': 5},
+                       {'sample': 585, 'weight': '-1', 'term': 30}, {'sample': 585, 'weight': '1e30', 'term': 30},
+                       {'sample': 585, 'weight': '9' * 29, 'term': 30}):
+            response = self.client.get(reverse('price_quote'), params)
+            self.assertEqual(response.status_code, 400)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        metrics_store.reset()
+        cache.clear()
+
+    @override_settings(SERVER_TIMING=True, METRICS_TOKEN='secret')
+    def test_view_metrics_are_recorded_and_exported(self):
+        create_branches(2)
+        response = self.client.get(reverse('branches'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+        summary = metrics_store.summary()['branches']
+        self.assertEqual(summary['count'], 1)
+        self.assertGreater(summary['sum']['queries'], 0)
+        self.assertGreater(summary['sum']['template_ms'], 0)
+
+        self.assertEqual(self.client.get(reverse('prometheus_metrics')).status_code, 403)
+        exported = self.client.get(reverse('prometheus_metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertIn('lombard_view_queries_count{view="branches"} 1', exported.content.decode())
+
+    def test_dashboard_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('admin_metrics')).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        self.client.get(reverse('about_us'))
+        response = self.client.get(reverse('admin_metrics'))
+        self.assertContains(response, 'about_us')
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics_store.reset()
+        self.factory = AsyncRequestFactory()
+
+    async def test_async_api_matches_sync(self):
+        await Branch.objects.abulk_create([
+            Branch(city='Кострома', street='Советская', house=str(i), phone='+74942123456',
+                   latitude=57.7, longitude=40.9)
+            for i in range(2)
+        ])
+        request = self.factory.get(reverse('api_branches'))
+        response = await api.branches_api_async(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, (await sync_to_async(api.branches_api)(request)).content)
+
+        cached = await api.branches_api_async(
+            self.factory.get(reverse('api_branches'), headers={'if-none-match': response['ETag']})
+        )
+        self.assertEqual(cached.status_code, 304)
+
+    async def test_async_pages_render(self):
+        await Branch.objects.acreate(
+            city='Кострома', street='Советская', house='1', phone='+74942123456', latitude=57.7, longitude=40.9
+        )
+
+        response = await branches.branches_view_async(self.factory.get(reverse('branches')))
+        self.assertContains(response, 'Советская')
+        response = await base.prices_view_async(self.factory.get(reverse('prices')))
+        self.assertEqual(response.status_code, 200)
+        response = await base.about_us_async(self.factory.get(reverse('about_us')))
+        self.assertEqual(response.status_code, 200)
+
+    async def test_async_pages_resolve_network_stats(self):
+        # Ленивый network_stats из контекст-процессора вызвал бы ORM в цикле событий
+        with patch('app_lombard.views.base.render', return_value=HttpResponse()) as render:
+            await base.prices_view_async(self.factory.get(reverse('prices')))
+            await base.about_us_async(self.factory.get(reverse('about_us')))
+        for call in render.call_args_list:
+            self.assertEqual(call.args[2]['network_stats']['total_active'], 0)
+
+    @override_settings(PRICE_EVENTS_POLL_INTERVAL=0.01)
+    async def test_price_events_stream(self):
+        price = await MetalPrice.objects.acreate(metal_type='gold', sample=585, price_per_gram=Decimal('5850'))
+        response = await api.price_events_api(self.factory.get(reverse('api_price_events')))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        self.assertIn('"gold_585":"5850,00"', (await anext(stream)).decode())
+
+        # Публикация сдвигает версию цен после фиксации транзакции
+        price.price_per_gram = Decimal('6000')
+        await price.asave()
+        await cache.aset(VERSION_KEY.format(namespace=PRICES_NAMESPACE), 'published', None)
+        self.assertIn('"gold_585":"6000,00"', (await anext(stream)).decode())
+        await stream.aclose()
+
+    async def test_price_events_not_gzipped(self):
+        response = await self.async_client.get(reverse('api_price_events'), headers={'accept-encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response)
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        await stream.aclose()
+
+    def test_price_events_without_asgi(self):
+        MetalPrice.objects.create(metal_type='gold', sample=585, price_per_gram=Decimal('5850'))
+        response = self.client.get(reverse('api_price_events'))
+        self.assertIn(b'5850,00', b''.join(response.streaming_content))
+
+        etag = get_price_board()['etag']
+        response = self.client.get(reverse('api_price_events'), headers={'last-event-id': etag})
+        self.assertNotIn(b'data:', b''.join(response.streaming_content))
+
+    async def test_middleware_records_async_requests(self):
+        await self.async_client.get(reverse('about_us'))
+        summary = metrics_store.summary()['about_us']
+        self.assertEqual(summary['count'], 1)
+        self.assertGreater(summary['sum']['queries'], 0)
+
+
+class BranchImportExportTests(TestCase):
+    csv_data = (
+        'city,street,house,phone,description,is_active,latitude,longitude,mon,tue,wed,thu,fri,sat,sun\n'
+        'Кострома,Самоковская,10Б,+7 (494) 212-34-56,,true,57.768,40.9269,'
+        '09:00-19:00,09:00-19:00,09:00-19:00,09:00-19:00,09:00-19:00,10:00-17:00,выходной\n'
+        'Кострома,Советская,1,123,,true,57.7,40.9,,,,,,,\n'
+    )
+
+    def import_file(self, suffix, content):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'branches{suffix}')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            with override_settings(CACHES=shared_cache(directory)):
+                call_command('import_branches', path, stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_import_validates_and_round_trips(self):
+        # Сброс справочника в процесс-локальном кэше не дойдет до сайта
+        with self.assertRaises(CommandError):
+            call_command('import_branches', 'branches.csv', stdout=io.StringIO())
+
+        self.import_file('.csv', self.csv_data)
+
+        branch = Branch.objects.get()
+        self.assertEqual(branch.phone, '+74942123456')
+        self.assertEqual(branch.phone_e164, '+74942123456')
+        self.assertEqual(branch.get_hours_for_day(5).opening_time, datetime.time(10, 0))
+        self.assertTrue(branch.get_hours_for_day(6).is_closed)
+
+        out = io.StringIO()
+        call_command('export_branches', format='jsonl', stdout=out)
+        exported = out.getvalue().replace('"sat": "10:00-17:00"', '"sat": "11:00-17:00"')
+        self.import_file('.jsonl', exported)
+
+        self.assertEqual(Branch.objects.count(), 1)
+        self.assertEqual(branch.get_hours_for_day(5).opening_time, datetime.time(11, 0))
+
+    def test_invalid_values_are_reported(self):
+        base = {'city': 'Кострома', 'street': 'Мира', 'house': '1', 'phone': '+74942123456',
+                'latitude': 57.7, 'longitude': 40.9}
+        records = [
+            {**base, 'house': '1' * 20},
+            {**base, 'latitude': 'NaN'},
+            {**base, 'longitude': 200},
+            {**base, 'mon': 900},
+            base,
+        ]
+        importer = BranchImporter()
+        importer.run(records)
+
+        self.assertEqual([line for line, _ in importer.errors], [1, 2, 3, 4])
+        self.assertIn('house', importer.errors[0][1])
+        self.assertEqual(importer.created, 1)
+
+    def test_malformed_json_line_is_reported(self):
+        importer = BranchImporter()
+        importer.run(read_records(io.StringIO('{"city": "Кострома"\n[1, 2]\n'), 'jsonl'))
+        self.assertEqual([line for line, _ in importer.errors], [1, 2])
+        self.assertIn('Некорректный JSON', importer.errors[0][1])
+
+
+class ResponsiveImageTests(SimpleTestCase):
+    template = Template("{% load responsive_images %}{% responsive_image 'photo.jpg' alt='Фото' class='photo' %}")
+
+    def tearDown(self):
+        load_manifest.cache_clear()
+
+    def test_fallback_without_manifest(self):
+        with override_settings(RESPONSIVE_IMAGES=False):
+            html = self.template.render(Context())
+        self.assertIn('<img src="/static/photo.jpg" alt="Фото"', html)
+        self.assertNotIn('<picture>', html)
+
+    def test_variants_and_picture(self):
+        try:
+            from PIL import Image
+        except ImportError:
+            self.skipTest('Pillow не установлен')
+
+        with tempfile.TemporaryDirectory() as source, tempfile.TemporaryDirectory() as static_root:
+            path = os.path.join(source, 'photo.jpg')
+            Image.new('RGB', (800, 400), 'gold').save(path)
+
+            with override_settings(
+                STATIC_ROOT=static_root, RESPONSIVE_IMAGES=True,
+                RESPONSIVE_IMAGE_WIDTHS=[320, 640, 1280], RESPONSIVE_IMAGE_FORMATS=['webp'],
+            ):
+                from django.contrib.staticfiles.storage import staticfiles_storage
+
+                self.assertEqual(generate_responsive_images(staticfiles_storage, {'photo.jpg': path}), (1, 0))
+                self.assertEqual(generate_responsive_images(staticfiles_storage, {'photo.jpg': path}), (0, 1))
+                html = self.template.render(Context())
+
+        self.assertIn('<source type="image/webp"', html)
+        # JPEG строится для запасного <img>, даже если его нет в RESPONSIVE_IMAGE_FORMATS
+        self.assertRegex(html, r'<img src="/static/responsive/photo\.800w\.[0-9a-f]{12}\.jpg"')
+        self.assertRegex(html, r'/static/responsive/photo\.320w\.[0-9a-f]{12}\.webp 320w')
+        # Картинки не увеличиваются: самый широкий вариант — исходные 800px
+        self.assertIn('800w', html)
+        self.assertNotIn('1280w', html)
+        self.assertIn('width="800" height="400"', html)
+        self.assertIn('class="photo"', html)
@@ -1,14 +1,35 @@
+from django.conf import settings
 from django.urls import path
-from .views.base import index, prices_view, questions_answers_view, news_view, contacts_view, about_us
-from .views import branches, conditions
+from .views.base import (
+    index, prices_view, prices_view_async, questions_answers_view, news_view, contacts_view,
+    about_us, about_us_async,
+)
+from .views import api, branches, conditions, quote
+
+
+def pick(sync_view, async_view):
+    """Асинхронная версия представления, если включен ASYNC_VIEWS (запуск под ASGI)"""
+    return async_view if settings.ASYNC_VIEWS else sync_view
+
 
 urlpatterns = [
     path('', index, name='index'),
-    path('branches/', branches.branches_view, name='branches'),
+    path('branches/', pick(branches.branches_view, branches.branches_view_async), name='branches'),
+    path('branches/nearest/', branches.nearest_branches_view, name='nearest_branches'),
+    path('branches/cards/', branches.branch_cards_view, name='branch_cards'),
     path('conditions/', conditions.conditions_view, name='conditions'),
-    path('prices/', prices_view, name='prices'),
+    path('prices/', pick(prices_view, prices_view_async), name='prices'),
+    path('prices/quote/', quote.quote_view, name='price_quote'),
     path('questions-answers/', questions_answers_view, name='questions_answers'),
     path('news/', news_view, name='news'),
     path('contacts/', contacts_view, name='contacts'),
-    path('about/', about_us, name='about_us'),
-]
\ No newline at end of file
+    path('about/', pick(about_us, about_us_async), name='about_us'),
+    path('api/branches/', pick(api.branches_api, api.branches_api_async), name='api_branches'),
+    path('api/branches/search/', api.branch_search_api, name='api_branch_search'),
+    path('api/branches/by-phone/', api.branch_by_phone_api, name='api_branch_by_phone'),
+    path('api/branches/map/', pick(api.branch_map_api, api.branch_map_api_async), name='api_branch_map'),
+    path('api/prices/', pick(api.prices_api, api.prices_api_async), name='api_prices'),
+    path('api/prices/events/', api.price_events_api, name='api_price_events'),
+    path('api/prices/history/', pick(api.price_history_api, api.price_history_api_async),
+         name='api_price_history'),
+]
@@ -0,0 +1,378 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.defaultfilters import date as format_date, floatformat
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_GET
+
+from ..branch_directory import get_branch_directory
+from ..branch_search import search_branches
+from ..map_clusters import branch_map_index
+from ..models import Branch, MetalPrice, MetalPriceHistory, normalize_phone
+from ..price_board import get_price_board, price_board
+from ..schedule_index import get_schedule_index, schedule_index
+from ..snapshots import BRANCHES_NAMESPACE, PRICES_NAMESPACE, VersionedSnapshot, aget_version
+
+
+def make_etag(*parts):
+    """Сильный ETag из частей, однозначно задающих ответ"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b'\0')
+    return quote_etag(digest.hexdigest())
+
+
+def conditional_json(request, etag, build_body):
+    """Отвечает 304 по If-None-Match или строит JSON через build_body()"""
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(build_body(), content_type='application/json')
+    response['ETag'] = etag
+    # Клиент может хранить ответ, но обязан перепроверять его по ETag
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+def build_branches_payload():
+    """Компактный JSON филиалов без статуса "открыт" (он меняется со временем)"""
+    directory = get_branch_directory()
+    cities = [
+        {
+            'city': city_data['city'],
+            'branches': [
+                {
+                    'id': branch['id'],
+                    'address': branch['address'],
+                    'phone': branch['formatted_phone'],
+                    'description': branch['description'],
+                    'latitude': branch['latitude'],
+                    'longitude': branch['longitude'],
+                    'schedule': [[day['day'], day['time']] for day in branch['schedule']],
+                }
+                for branch in city_data['branches']
+            ],
+        }
+        for city_data in directory['cities']
+    ]
+    body = json.dumps(cities, ensure_ascii=False, separators=(',', ':'))
+    return {
+        'body': body,
+        'branch_ids': directory['branch_ids'],
+        'etag': hashlib.sha1(body.encode()).hexdigest(),
+    }
+
+
+branches_payload = VersionedSnapshot('branches_api', BRANCHES_NAMESPACE, build_branches_payload)
+
+
+def branches_response(request, payload, index):
+    open_ids = sorted(index.open_ids_at(branch_ids=payload['branch_ids']))
+    etag = make_etag(payload['etag'], open_ids)
+
+    def build_body():
+        return '{"open_branch_ids":%s,"cities":%s}' % (
+            json.dumps(open_ids, separators=(',', ':')), payload['body']
+        )
+
+    return conditional_json(request, etag, build_body)
+
+
+@require_GET
+def branches_api(request):
+    """Филиалы по городам и список открытых сейчас филиалов"""
+    return branches_response(request, branches_payload.get(), get_schedule_index())
+
+
+@require_GET
+async def branches_api_async(request):
+    return branches_response(request, await branches_payload.aget(), await schedule_index.aget())
+
+
+SEARCH_MIN_LENGTH = 2
+
+
+@require_GET
+def branch_search_api(request):
+    """Поиск активных филиалов по городу, улице и дому с учетом опечаток, лучшие совпадения первыми"""
+    query = request.GET.get('q', '').strip()
+    if len(query) < SEARCH_MIN_LENGTH:
+        return JsonResponse({'error': f'Введите не меньше {SEARCH_MIN_LENGTH} символов'}, status=400)
+
+    branches = search_branches(query)
+    open_ids = get_schedule_index().open_ids_at(branch_ids=[branch['id'] for branch in branches])
+    return JsonResponse({
+        'query': query,
+        'branches': [
+            {
+                'id': branch['id'],
+                'city': branch['city'],
+                'address': f"{branch['street']}, {branch['house']}",
+                'phone': branch['phone_display'],
+                'latitude': branch['latitude'],
+                'longitude': branch['longitude'],
+                'is_open': branch['id'] in open_ids,
+            }
+            for branch in branches
+        ],
+    })
+
+
+@require_GET
+def branch_by_phone_api(request):
+    """Филиалы по номеру телефона в любом формате (для телефонии): один запрос по индексу phone_e164"""
+    phone = normalize_phone(request.GET.get('phone', ''))
+    if not phone:
+        return JsonResponse({'error': 'Укажите российский номер телефона: phone=+7XXXXXXXXXX'}, status=400)
+
+    branches = Branch.objects.filter(phone_e164=phone).order_by('-is_active', 'city', 'street')
+    return JsonResponse({
+        'phone': phone,
+        'branches': [
+            {
+                'id': branch['id'],
+                'city': branch['city'],
+                'address': f"{branch['street']}, {branch['house']}",
+                'phone': branch['phone_display'],
+                'is_active': branch['is_active'],
+            }
+            for branch in branches.values('id', 'city', 'street', 'house', 'phone_display', 'is_active')
+        ],
+    })
+
+
+# Максимальный zoom карты (как у Яндекс.Карт)
+MAX_MAP_ZOOM = 23
+MAP_REQUEST_ERROR = 'Укажите bbox=юг,запад,север,восток и zoom'
+
+
+def parse_bbox(value):
+    """'юг,запад,север,восток' -> кортеж из четырех чисел"""
+    south, west, north, east = (float(part) for part in value.split(','))
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError(value)
+    return south, west, north, east
+
+
+def parse_map_request(request):
+    """(юг, запад, север, восток, zoom) из параметров запроса карты"""
+    south, west, north, east = parse_bbox(request.GET['bbox'])
+    zoom = min(max(int(request.GET['zoom']), 0), MAX_MAP_ZOOM)
+    return south, west, north, east, zoom
+
+
+def query_branch_map(south, west, north, east, zoom):
+    # Область через 180-й меридиан запрашиваем двумя частями
+    parts = [(west, east)] if west <= east else [(west, 180), (-180, east)]
+    clusters, branches = [], []
+    for part_west, part_east in parts:
+        part_clusters, part_branches = branch_map_index.query(south, part_west, north, part_east, zoom)
+        clusters += part_clusters
+        branches += part_branches
+    return clusters, branches
+
+
+def branch_map_response(zoom, clusters, branches, index):
+    open_ids = index.open_ids_at(branch_ids=[branch[0] for branch in branches])
+    return JsonResponse({
+        'zoom': zoom,
+        'clusters': clusters,
+        'branches': branches,
+        'open_branch_ids': sorted(open_ids),
+    })
+
+
+@require_GET
+def branch_map_api(request):
+    """Филиалы в видимой области карты: кластеры для мелкого масштаба, отдельные точки для крупного"""
+    try:
+        south, west, north, east, zoom = parse_map_request(request)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': MAP_REQUEST_ERROR}, status=400)
+
+    clusters, branches = query_branch_map(south, west, north, east, zoom)
+    return branch_map_response(zoom, clusters, branches, get_schedule_index())
+
+
+@require_GET
+async def branch_map_api_async(request):
+    try:
+        south, west, north, east, zoom = parse_map_request(request)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': MAP_REQUEST_ERROR}, status=400)
+
+    # Индекс может догружать изменения из БД, поэтому запрос идет в потоке
+    clusters, branches = await sync_to_async(query_branch_map)(south, west, north, east, zoom)
+    return branch_map_response(zoom, clusters, branches, await schedule_index.aget())
+
+
+def prices_response(request, board):
+    etag = make_etag(board['etag'])
+
+    def build_body():
+        prices = {}
+        for metal_type, _ in MetalPrice.METAL_CHOICES:
+            prices[metal_type] = [
+                {'sample': row['sample'], 'price': str(row['price_per_gram'])}
+                for row in board[metal_type]
+            ]
+        return json.dumps({
+            'updated_at': board['updated_at'].isoformat() if board['updated_at'] else None,
+            'prices': prices,
+        }, separators=(',', ':'))
+
+    return conditional_json(request, etag, build_body)
+
+
+@require_GET
+def prices_api(request):
+    """Текущие цены на пробы металлов"""
+    return prices_response(request, get_price_board())
+
+
+@require_GET
+async def prices_api_async(request):
+    return prices_response(request, await price_board.aget())
+
+
+# Комментарий-пинг раз в столько секунд: прокси не закрывают соединение, а отключившийся клиент обнаруживается
+PRICE_EVENTS_HEARTBEAT = 15
+
+
+def price_event(board):
+    """Событие SSE с табло цен в том виде, как на странице prices.html; id события — версия табло"""
+    data = json.dumps({
+        'prices': {key: floatformat(price, 2) for key, price in board['prices'].items()},
+        'updated': format_date(timezone.localtime(board['updated_at']), 'd E Y года') if board['updated_at'] else None,
+    }, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {board['etag']}\ndata: {data}\n\n"
+
+
+async def price_event_stream(last_event_id):
+    """Шлет табло при каждой смене версии цен, пока соединение не состарится.
+
+    Проверка версии — одно чтение ключа из кэша; табло перестраивается только после публикации.
+    """
+    yield f'retry: {settings.PRICE_EVENTS_RETRY_MS}\n\n'
+    started = last_sent = time.monotonic()
+    version = None
+    while True:
+        current = await aget_version(PRICES_NAMESPACE)
+        if current != version:
+            version = current
+            board = await price_board.aget()
+            if board['etag'] != last_event_id:
+                last_event_id = board['etag']
+                last_sent = time.monotonic()
+                yield price_event(board)
+
+        now = time.monotonic()
+        if now - started >= settings.PRICE_EVENTS_MAX_AGE:
+            # Клиент переподключится с Last-Event-ID и не получит то же табло повторно
+            return
+        if now - last_sent >= PRICE_EVENTS_HEARTBEAT:
+            last_sent = now
+            yield ':\n\n'
+        await asyncio.sleep(settings.PRICE_EVENTS_POLL_INTERVAL)
+
+
+@require_GET
+async def price_events_api(request):
+    """Поток обновлений цен (Server-Sent Events) для страницы цен.
+
+    Под ASGI соединение держится открытым и новые цены приходят сразу после публикации.
+    Под WSGI поток занимал бы рабочий поток сервера, поэтому отдаются только изменения
+    на текущий момент, а клиент переподключается через PRICE_EVENTS_RETRY_MS.
+    """
+    last_event_id = request.headers.get('Last-Event-ID')
+    if isinstance(request, ASGIRequest):
+        events = price_event_stream(last_event_id)
+    else:
+        board = await price_board.aget()
+        events = [f'retry: {settings.PRICE_EVENTS_RETRY_MS}\n\n']
+        if board['etag'] != last_event_id:
+            events.append(price_event(board))
+
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx не должен буферизовать поток
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def parse_moment(value):
+    """Разбирает дату/время из параметра запроса (ISO 8601), без пояса — местное время"""
+    if not value:
+        return None
+    moment = parse_datetime(value) or parse_datetime(f'{value}T00:00')
+    if moment is None:
+        raise ValueError(value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+# История только дополняется: без from отдаем последние HISTORY_DEFAULT_DAYS дней,
+# и в любом случае не больше HISTORY_MAX_POINTS последних точек периода
+HISTORY_DEFAULT_DAYS = 30
+HISTORY_MAX_POINTS = 5000
+
+
+def parse_history_request(request):
+    """(металл, проба, начало, конец) из параметров запроса истории цен"""
+    end = parse_moment(request.GET.get('to'))
+    start = parse_moment(request.GET.get('from'))
+    if start is None:
+        start = (end or timezone.now()) - timedelta(days=HISTORY_DEFAULT_DAYS)
+    return request.GET.get('metal', 'gold'), int(request.GET.get('sample', 585)), start, end
+
+
+def latest_points(series):
+    """Последние HISTORY_MAX_POINTS точек ряда (запрос без среза)"""
+    return series.reverse()[:HISTORY_MAX_POINTS]
+
+
+def price_history_response(metal_type, sample, latest):
+    """latest — точки от новых к старым, как их вернул latest_points()"""
+    return JsonResponse({
+        'metal': metal_type,
+        'sample': sample,
+        'points': [[moment.isoformat(), str(price)] for moment, price in reversed(latest)],
+        'truncated': len(latest) == HISTORY_MAX_POINTS,
+    })
+
+
+HISTORY_REQUEST_ERROR = 'Некорректные параметры запроса'
+
+
+@require_GET
+def price_history_api(request):
+    """История цены пробы за период: [[время, цена], ...]"""
+    try:
+        metal_type, sample, start, end = parse_history_request(request)
+    except ValueError:
+        return JsonResponse({'error': HISTORY_REQUEST_ERROR}, status=400)
+
+    series = MetalPriceHistory.objects.series(metal_type, sample, start, end)
+    return price_history_response(metal_type, sample, list(latest_points(series)))
+
+
+@require_GET
+async def price_history_api_async(request):
+    try:
+        metal_type, sample, start, end = parse_history_request(request)
+    except ValueError:
+        return JsonResponse({'error': HISTORY_REQUEST_ERROR}, status=400)
+
+    series = MetalPriceHistory.objects.series(metal_type, sample, start, end)
+    return price_history_response(metal_type, sample, [row async for row in latest_points(series)])
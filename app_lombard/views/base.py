@@ -1,43 +1,68 @@
 # views/main_views.py
+from django.conf import settings
 from django.shortcuts import render
 from django.utils import timezone
-from app_lombard.models import MetalPrice, Branch
+from app_lombard.network_stats import aget_network_stats, get_network_stats
+from app_lombard.page_cache import cache_page_versioned
+from app_lombard.price_board import get_price_board, price_board
+from app_lombard.snapshots import BRANCHES_NAMESPACE
 
 
+@cache_page_versioned('index')
 def index(request):
     return render(request, 'index.html')
 
 
+def prices_context(board):
+    return {
+        'gold_prices': board['gold'],
+        'silver_prices': board['silver'],
+        'latest_update': board['updated_at'] or timezone.now(),
+        'loan_terms': sorted(settings.LOAN_DAILY_RATES),
+    }
+
+
 def prices_view(request):
-    gold_prices = MetalPrice.objects.filter(metal_type='gold').order_by('sample')
-    silver_prices = MetalPrice.objects.filter(metal_type='silver').order_by('sample')
-    latest_update = MetalPrice.objects.all().order_by('-created_at').first()
+    return render(request, 'prices.html', prices_context(get_price_board()))
 
-    context = {
-        'gold_prices': gold_prices,
-        'silver_prices': silver_prices,
-        'latest_update': latest_update.created_at if latest_update else timezone.now(),
-    }
+
+async def prices_view_async(request):
+    # Статистика для шаблона считается заранее: ленивый network_stats нельзя вычислять в цикле событий
+    context = {**prices_context(await price_board.aget()), 'network_stats': await aget_network_stats()}
     return render(request, 'prices.html', context)
 
 
+@cache_page_versioned('questions_answers')
 def questions_answers_view(request):
     return render(request, 'questions_answers.html')
 
 
+@cache_page_versioned('news')
 def news_view(request):
     return render(request, 'news.html')
 
 
+@cache_page_versioned('contacts')
 def contacts_view(request):
     return render(request, 'base/contacts.html')
 
 
+@cache_page_versioned('about_us', [BRANCHES_NAMESPACE])
 def about_us(request):
-    active_branches_count = Branch.objects.filter(is_active=True).count()
+    context = {
+        'active_branches_count': get_network_stats()['total_active'],
+        'title': 'О нас | Ломбард Народный'
+    }
+
+    return render(request, 'base/about_us.html', context)
+
 
+@cache_page_versioned('about_us', [BRANCHES_NAMESPACE])
+async def about_us_async(request):
+    stats = await aget_network_stats()
     context = {
-        'active_branches_count': active_branches_count,
+        'active_branches_count': stats['total_active'],
+        'network_stats': stats,
         'title': 'О нас | Ломбард Народный'
     }
 
@@ -1,81 +1,140 @@
+from django.conf import settings
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
-from ..models import Branch
 import json
-from django.utils import timezone
-from collections import defaultdict
 
+from ..branch_directory import branch_directory, get_branch_directory
+from ..geo import find_nearest_branches
+from ..network_stats import aget_network_stats, get_network_stats
+from ..schedule_index import get_schedule_index, schedule_index
 
-def branches_view(request):
-    # Получаем все активные филиалы
-    branches = Branch.objects.filter(is_active=True).prefetch_related('working_hours')
+NEAREST_BRANCHES_LIMIT = 50
 
-    # Группируем филиалы по городам
-    cities_dict = defaultdict(list)
 
+def with_status(branches, open_ids):
+    """Карточки филиалов со статусом "открыт сейчас" """
+    result = []
     for branch in branches:
-        # Получаем расписание для каждого филиала
-        schedule = []
-        working_hours = branch.working_hours.all().order_by('day_of_week')
-
-        for wh in working_hours:
-            if wh.is_closed:
-                time_str = "Выходной"
-            else:
-                open_time = wh.opening_time.strftime('%H:%M') if wh.opening_time else '--:--'
-                close_time = wh.closing_time.strftime('%H:%M') if wh.closing_time else '--:--'
-                time_str = f"{open_time} - {close_time}"
-
-            schedule.append({
-                'day': wh.get_day_of_week_display(),
-                'time': time_str,
-                'is_closed': wh.is_closed
-            })
-
-        # Проверяем, открыт ли филиал сейчас
-        is_open_now = branch.is_open_now()
-
-        branch_data = {
-            'id': branch.id,
-            'city': branch.city,
-            'address': f"{branch.street}, {branch.house}",
-            'phone': branch.phone,
-            'formatted_phone': branch.get_formatted_phone(),  # ← ДОБАВЛЕНО
-            'description': branch.description,
-            'latitude': float(branch.latitude) if branch.latitude else None,
-            'longitude': float(branch.longitude) if branch.longitude else None,
-            'schedule': schedule,
+        is_open_now = branch['id'] in open_ids
+        result.append({
+            **branch,
             'is_open_now': is_open_now,
             'status_color': 'green' if is_open_now else 'red',
             'status_text': 'Открыт' if is_open_now else 'Закрыт'
-        }
+        })
+    return result
+
 
-        cities_dict[branch.city].append(branch_data)
+def branches_context(directory, index, stats):
+    """Контекст страницы филиалов по справочнику, индексу расписаний и статистике сети"""
+    # В большой сети страница несет только первые карточки городов, а метки карт
+    # и остальные карточки подгружаются при открытии города
+    lazy_map = directory['total_branches'] > settings.BRANCHES_LAZY_MAP_THRESHOLD
+    limit = settings.BRANCHES_INITIAL_CARDS if lazy_map else None
+
+    # Статус "открыт сейчас" зависит от времени, поэтому считаем его на каждый запрос,
+    # но только для филиалов на странице: общее число открытых берем из статистики сети
+    if lazy_map:
+        branch_ids = [b['id'] for city_data in directory['cities'] for b in city_data['branches'][:limit]]
+    else:
+        branch_ids = directory['branch_ids']
+    open_ids = index.open_ids_at(branch_ids=branch_ids)
 
-    # Формируем данные для городов
     cities_data = []
-    for city, city_branches in cities_dict.items():
+    for city_data in directory['cities']:
+        city_branches = with_status(city_data['branches'][:limit], open_ids)
         cities_data.append({
-            'city': city,
-            'branch_count': len(city_branches),
-            'branches': city_branches
+            **city_data,
+            'branches': city_branches,
+            'more_branches': city_data['branch_count'] - len(city_branches),
         })
 
-    # Сортируем города по алфавиту
-    cities_data.sort(key=lambda x: x['city'])
+    return {
+        'cities': cities_data,
+        'lazy_map': lazy_map,
+        'cities_json': None if lazy_map else directory['cities_json'],
+        'open_branch_ids_json': '[]' if lazy_map else json.dumps(sorted(open_ids)),
+        'total_branches': directory['total_branches'],
+        'active_branches': stats['open_now'],
+        'network_stats': stats,
+        'branch_card_ttl': settings.BRANCH_CARD_CACHE_TTL,
+    }
+
+
+def branches_view(request):
+    # Справочник филиалов строится один раз и сбрасывается при изменениях
+    directory = get_branch_directory()
+    context = branches_context(directory, get_schedule_index(), get_network_stats())
+    return render(request, 'branches.html', context)
+
+
+async def branches_view_async(request):
+    directory = await branch_directory.aget()
+    context = branches_context(directory, await schedule_index.aget(), await aget_network_stats())
+    return render(request, 'branches.html', context)
 
-    # Данные для JSON (для карт)
-    cities_json_data = []
-    for city_data in cities_data:
-        cities_json_data.append({
-            'city': city_data['city'],
-            'branches': [b for b in city_data['branches'] if b['latitude'] and b['longitude']]
-        })
 
+def branch_cards_view(request):
+    """Карточки филиалов города начиная с offset (HTML-фрагмент для страницы филиалов)"""
+    try:
+        offset = max(0, int(request.GET.get('offset', 0)))
+    except ValueError:
+        return HttpResponseBadRequest('Некорректный offset')
+
+    city = request.GET.get('city')
+    for city_data in get_branch_directory()['cities']:
+        if city_data['city'] == city:
+            branches = city_data['branches'][offset:]
+            break
+    else:
+        raise Http404('Город не найден')
+
+    open_ids = get_schedule_index().open_ids_at(branch_ids=[branch['id'] for branch in branches])
     context = {
-        'cities': cities_data,
-        'cities_json': json.dumps(cities_json_data, ensure_ascii=False),
-        'total_branches': len(branches),
-        'active_branches': len([b for b in branches if b.is_open_now()])
+        'branches': with_status(branches, open_ids),
+        'branch_card_ttl': settings.BRANCH_CARD_CACHE_TTL,
     }
+    return render(request, 'includes/branch_cards.html', context)
+
+
+def nearest_branches_view(request):
+    """Ближайшие к точке активные филиалы (JSON)"""
+    try:
+        latitude = float(request.GET['lat'])
+        longitude = float(request.GET['lon'])
+        limit = int(request.GET.get('k', 5))
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Укажите координаты lat и lon'}, status=400)
+
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return JsonResponse({'error': 'Некорректные координаты'}, status=400)
+    limit = max(1, min(limit, NEAREST_BRANCHES_LIMIT))
+
+    index = get_schedule_index()
+    branch_filter = None
+    if request.GET.get('open_now') in ('1', 'true'):
+        open_ids = index.open_ids_at()
+
+        def branch_filter(branch):
+            return branch['id'] in open_ids
+
+    nearest = find_nearest_branches(latitude, longitude, limit, branch_filter)
+    statuses = index.status_at(branch_ids=[branch['id'] for branch, _ in nearest])
+
+    result = []
+    for branch, distance in nearest:
+        status = statuses[branch['id']]
+        result.append({
+            'id': branch['id'],
+            'city': branch['city'],
+            'address': branch['address'],
+            'phone': branch['formatted_phone'],
+            'latitude': branch['latitude'],
+            'longitude': branch['longitude'],
+            'distance_km': round(distance, 2),
+            'is_open_now': status.is_open,
+            'closes_in': status.closes_in,
+            'opens_at': status.opens_at.isoformat() if status.opens_at else None,
+        })
 
-    return render(request, 'branches.html', context)
\ No newline at end of file
+    return JsonResponse({'branches': result})
\ No newline at end of file
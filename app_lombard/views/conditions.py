@@ -1,4 +1,8 @@
 from django.shortcuts import render
 
+from ..page_cache import cache_page_versioned
+
+
+@cache_page_versioned('conditions')
 def conditions_view(request):
     return render(request, 'conditions.html')
\ No newline at end of file
@@ -0,0 +1,67 @@
+import hmac
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseForbidden
+from django.shortcuts import render
+
+from ..instrumentation import METRICS, metrics_store
+
+METRIC_HELP = {
+    'queries': 'SQL-запросов на запрос',
+    'db_ms': 'Время в базе данных, мс',
+    'template_ms': 'Время рендера шаблонов, мс',
+    'total_ms': 'Полное время ответа, мс',
+}
+
+
+@staff_member_required
+def metrics_dashboard(request):
+    """Страница админки с перцентилями по представлениям"""
+    rows = []
+    for view, data in metrics_store.summary().items():
+        rows.append({
+            'view': view,
+            'count': data['count'],
+            'metrics': [
+                {'name': METRIC_HELP[metric], 'percentiles': data['percentiles'][metric]}
+                for metric in METRICS
+            ],
+        })
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Производительность представлений',
+        'rows': rows,
+    }
+    return render(request, 'admin/metrics.html', context)
+
+
+def has_metrics_access(request):
+    """Доступ к метрикам: сотрудник или Bearer-токен из METRICS_TOKEN"""
+    if request.user.is_active and request.user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+def prometheus_metrics(request):
+    """Метрики в текстовом формате Prometheus"""
+    if not has_metrics_access(request):
+        return HttpResponseForbidden()
+
+    summary = metrics_store.summary()
+    lines = []
+    for metric in METRICS:
+        name = f'lombard_view_{metric}'
+        lines.append(f'# HELP {name} {METRIC_HELP[metric]}')
+        lines.append(f'# TYPE {name} summary')
+        for view, data in summary.items():
+            for quantile, value in data['percentiles'][metric].items():
+                lines.append(f'{name}{{view="{view}",quantile="{quantile}"}} {value:.3f}')
+            lines.append(f'{name}_sum{{view="{view}"}} {data["sum"][metric]:.3f}')
+            lines.append(f'{name}_count{{view="{view}"}} {data["count"]}')
+
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
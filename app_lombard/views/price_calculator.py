@@ -1,19 +1,42 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+GOLD_SAMPLES = (375, 500, 585, 750, 850)
+
+
+def to_decimal(value):
+    """Приводит цену к Decimal без двоичных хвостов float"""
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+
+def batch_price_calculator(base_prices, samples=GOLD_SAMPLES, base_sample=585, decimals=0):
+    """Пересчитывает набор базовых цен в цены остальных проб.
+
+    Возвращает таблицу: по строке на каждую базовую цену с ключами "base" и
+    "proba_XXX". Цена базовой пробы остается как есть, остальные округляются
+    до decimals знаков по правилу ROUND_HALF_UP.
+    """
+    quantum = Decimal(1).scaleb(-decimals)
+    base_sample = Decimal(base_sample)
+    columns = [(f"proba_{sample}", Decimal(sample)) for sample in samples]
+
+    table = []
+    for base in map(to_decimal, base_prices):
+        row = {'base': base}
+        for key, sample in columns:
+            if sample == base_sample:
+                row[key] = base
+            else:
+                row[key] = (base * sample / base_sample).quantize(quantum, rounding=ROUND_HALF_UP)
+        table.append(row)
+    return table
 
 
 def price_calculator(main_proba, decimals=0):
     """Функция для подсчета остальных проб."""
-    proba_375 = round(main_proba * 375 / 585, decimals)
-    proba_500 = round(main_proba * 500 / 585, decimals)
-    proba_585 = main_proba
-    proba_750 = round(main_proba * 750 / 585, decimals)
-    proba_850 = round(main_proba * 850 / 585, decimals)
-
-    result = {
-        "proba_375": proba_375,
-        "proba_500": proba_500,
-        "proba_585": proba_585,
-        "proba_750": proba_750,
-        "proba_850": proba_850
-    }
-
+    result = batch_price_calculator([main_proba], decimals=decimals)[0]
+    del result['base']
     return result
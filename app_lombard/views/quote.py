@@ -0,0 +1,20 @@
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from ..quotes import QuoteError, calculate_quote
+
+
+@require_GET
+def quote_view(request):
+    """Калькулятор займа под залог (JSON)"""
+    try:
+        quote = calculate_quote(
+            request.GET.get('metal', 'gold'),
+            request.GET.get('sample'),
+            request.GET.get('weight', '').replace(',', '.'),
+            request.GET.get('term'),
+        )
+    except QuoteError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({key: str(value) for key, value in quote.items()})
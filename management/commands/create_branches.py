@@ -13,7 +13,7 @@ class Command(BaseCommand):
             street='Самоковская',
             house='10Б',
             defaults={
-                'phone': '+7 (4942) 123-456',
+                'phone': '+74942123456',
                 'description': 'Главный филиал ломбарда',
                 'latitude': 57.7680,
                 'longitude': 40.9269,
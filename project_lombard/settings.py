@@ -26,10 +26,15 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('SECRET_KEY')
 
+# Профиль окружения: development или production (DJANGO_ENV в .env).
+# production выключает DEBUG, кэширует шаблоны и отдает сжатую статику с хэшами в именах
+DJANGO_ENV = os.getenv('DJANGO_ENV', 'development')
+PRODUCTION = DJANGO_ENV == 'production'
+
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', str(not PRODUCTION)) == 'True'
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [host for host in os.getenv('ALLOWED_HOSTS', '').split(',') if host]
 
 
 # Application definition
@@ -40,12 +45,16 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    # app_lombard раньше staticfiles: его collectstatic дополнительно собирает варианты картинок
+    'app_lombard',
     'django.contrib.staticfiles',
-    'app_lombard'
 ]
 
 MIDDLEWARE = [
+    'app_lombard.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Сжимает HTML и JSON (кроме потока цен); статику в production WhiteNoise отдает уже сжатой (см. ниже)
+    'app_lombard.compression.GZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,11 +63,18 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if PRODUCTION:
+    # Статику отдает сам Django через WhiteNoise, раньше сжатия: готовые .gz/.br не сжимаются повторно
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('app_lombard.compression.GZipMiddleware'), 'whitenoise.middleware.WhiteNoiseMiddleware'
+    )
+
 ROOT_URLCONF = 'project_lombard.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Обычный шаблонизатор Django, дополнительно засекающий время рендера
+        'BACKEND': 'app_lombard.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -66,20 +82,39 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'app_lombard.context_processors.network_stats',
             ],
         },
     },
 ]
+if PRODUCTION:
+    # Скомпилированные шаблоны живут до перезапуска процесса, изменения файлов не отслеживаются
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
 
 WSGI_APPLICATION = 'project_lombard.wsgi.application'
 
+# Метрики представлений: заголовок Server-Timing в ответах
+# и токен для сбора метрик Prometheus (/metrics/)
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'False') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Асинхронные версии страниц и JSON API (имеет смысл при запуске под ASGI, см. asgi.py)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Для локальных прогонов (например, бенчмарка) можно указать django.db.backends.sqlite3
+        'ENGINE': os.getenv('ENGINE_DB', 'django.db.backends.postgresql'),
         'NAME': os.getenv("NAME_DB"),
         'HOST': os.getenv('HOST_DB'),
         'PORT': os.getenv('PORT_DB'),
@@ -88,6 +123,70 @@ DATABASES = {
     }
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Триграммные lookup'ы для поиска филиалов (см. app_lombard/branch_search.py)
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# Соединения с БД (DB_POOL_MODE):
+#   persistent — соединение потока живет DB_CONN_MAX_AGE секунд и проверяется
+#                перед повторным использованием (по умолчанию, подходит для WSGI);
+#   pool       — пул соединений psycopg 3 (нужен пакет psycopg[pool] вместо psycopg2-binary),
+#                его стоит выбрать для ASGI, где постоянные соединения не переиспользуются;
+#   none       — новое соединение на каждый запрос.
+# Сравнить режимы: python manage.py benchmark_connections
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'persistent')
+if DB_POOL_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_POOL_MODE == 'pool':
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            # Сколько секунд ждать свободное соединение, прежде чем вернуть ошибку
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+        },
+    }
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Порог похожести слова для поиска филиалов с опечатками (оператор %> и GIN-индексы pg_trgm).
+    # Стандартные 0.6 отсекают даже одну замену буквы: «кастрома» похожа на «Кострому» на 0.56
+    BRANCH_SEARCH_WORD_SIMILARITY = os.getenv('BRANCH_SEARCH_WORD_SIMILARITY', '0.5')
+    DATABASES['default'].setdefault('OPTIONS', {})['options'] = (
+        f'-c pg_trgm.word_similarity_threshold={BRANCH_SEARCH_WORD_SIMILARITY}'
+    )
+
+
+# Кэш: версии данных и снимки (справочник филиалов, табло цен) хранятся здесь.
+# LocMemCache подходит только для одного процесса: несколько воркеров сервера и команды
+# (ingest_prices, import_branches, refresh_network_stats) требуют общего бэкенда (Redis, Memcached)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'lombard'),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    # По умолчанию LocMemCache хранит 300 ключей — меньше, чем карточек филиалов
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '10000'))}
+
+
+# Калькулятор займа: доля оценки, выдаваемая на руки,
+# и ставка в день (доля) для каждого срока займа в днях
+LOAN_TO_VALUE = os.getenv('LOAN_TO_VALUE', '0.80')
+LOAN_DAILY_RATES = {
+    7: '0.0030',
+    14: '0.0028',
+    30: '0.0025',
+    60: '0.0022',
+}
+
+# Поток цен (SSE): как часто проверять версию табло (секунды), сколько держать соединение
+# до переподключения (секунды) и через сколько переподключаться клиенту (миллисекунды)
+PRICE_EVENTS_POLL_INTERVAL = float(os.getenv('PRICE_EVENTS_POLL_INTERVAL', '2'))
+PRICE_EVENTS_MAX_AGE = int(os.getenv('PRICE_EVENTS_MAX_AGE', '300'))
+PRICE_EVENTS_RETRY_MS = int(os.getenv('PRICE_EVENTS_RETRY_MS', '5000'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -131,7 +230,51 @@ STATICFILES_DIRS = [
 ]
 
 # Папка для собранных статических файлов (collectstatic)
-STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        # В production collectstatic добавляет хэш в имена и кладет рядом .gz и .br версии
+        'BACKEND': (
+            'whitenoise.storage.CompressedManifestStaticFilesStorage' if PRODUCTION
+            else 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        ),
+    },
+}
+
+# Файлы с хэшем в имени (и варианты картинок) браузер кэширует навсегда, остальные — WHITENOISE_MAX_AGE
+WHITENOISE_IMMUTABLE_FILE_TEST = r'\.[0-9a-f]{12}\.\w+$'
+WHITENOISE_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '3600'))
+
+# Кэш страниц целиком (секунды); страницы, зависящие от данных, сбрасываются по версии данных
+PAGE_CACHE_TTL = {
+    'index': 60 * 60,
+    'conditions': 60 * 60,
+    'questions_answers': 60 * 60,
+    'news': 10 * 60,
+    'contacts': 60 * 60,
+    'about_us': 60 * 60,
+}
+# Кэш карточек филиалов на странице филиалов
+BRANCH_CARD_CACHE_TTL = 24 * 60 * 60
+# Если филиалов больше порога, страница филиалов не встраивает данные карт,
+# а показывает первые BRANCHES_INITIAL_CARDS карточек города и догружает остальное
+BRANCHES_LAZY_MAP_THRESHOLD = int(os.getenv('BRANCHES_LAZY_MAP_THRESHOLD', '100'))
+BRANCHES_INITIAL_CARDS = 20
+# До этого zoom включительно метки на карте филиалов группируются в кластеры на сервере
+MAP_CLUSTER_MAX_ZOOM = 14
+# Индекс карты догружает изменения по updated_at; правки в обход него (update(), SQL)
+# подхватывает полная перестройка не реже чем раз в столько секунд
+MAP_FULL_REBUILD_SECONDS = int(os.getenv('MAP_FULL_REBUILD_SECONDS', '600'))
+
+# Адаптивные варианты картинок (создаются collectstatic, нужен Pillow).
+# В разработке отключены: runserver не отдает файлы из STATIC_ROOT
+RESPONSIVE_IMAGES = not DEBUG
+RESPONSIVE_IMAGE_WIDTHS = [320, 640, 960, 1280, 1920]
+RESPONSIVE_IMAGE_FORMATS = ['avif', 'webp', 'jpeg']
 
 # Медиа файлы (пользовательские загрузки)
 MEDIA_URL = '/media/'
@@ -19,8 +19,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from app_lombard.views.metrics import metrics_dashboard, prometheus_metrics
+
 urlpatterns = [
+    path('admin/metrics/', metrics_dashboard, name='admin_metrics'),
     path('admin/', admin.site.urls),
+    path('metrics/', prometheus_metrics, name='prometheus_metrics'),
     path('', include('app_lombard.urls')),
 ]
 